@@ -0,0 +1,289 @@
+import argparse
+import glob
+import json
+import os
+import resource
+import tempfile
+import time
+import tracemalloc
+import pandas as pd
+from CricBase import data_read
+from CricBase import database
+from CricBase import synthetic
+
+def time_call(function, *args) :
+    """
+    Times a single call of a function.
+
+    Arguments:
+        function : the function to call.
+        args : arguments to pass to the function.
+    Returns:
+        result : the function's return value.
+        elapsed : the wall time taken by the call, in seconds.
+    """
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
+
+def measure(function, memory: bool = True) :
+    """
+    Times a single call of a function taking no arguments, along with the most memory
+    allocated during the call.
+
+    Arguments:
+        function : the function to call.
+        memory : whether to trace allocations, which slows the call down noticeably.
+    Returns:
+        result : the function's return value.
+        elapsed : the wall time taken by the call, in seconds.
+        peak : the peak memory allocated by the call beyond what was already in use, in bytes,
+            or None if allocations weren't traced.
+    """
+    if not memory :
+        result, elapsed = time_call(function)
+        return result, elapsed, None
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    baseline = tracemalloc.get_traced_memory()[0]
+    try :
+        result, elapsed = time_call(function)
+        return result, elapsed, tracemalloc.get_traced_memory()[1] - baseline
+    finally :
+        tracemalloc.stop()
+
+def bare_reader(path: str, workers: int = None) :
+    """Creates a DataRead object for a path without reading anything, so each step can be run by hand."""
+    db = data_read.DataRead.__new__(data_read.DataRead)
+    db.path = path
+    db.workers = workers
+    db.files = None
+    db.cache = None
+    db.metrics = None
+    db.json_backend = data_read.json_backend_name()
+    return db
+
+def three_pass(db) :
+    """Builds the JSON tables the original way, re-reading every file for each table."""
+    match_df = db.match_data()
+    player_df, player_match_df = db.player_data()
+    delivery_df, wicket_df, extra_df, fielder_wicket_df = db.delivery_data()
+    return match_df, player_df, player_match_df, delivery_df, wicket_df, extra_df, fielder_wicket_df
+
+def single_pass(db) :
+    """Builds the JSON tables in one pass over the files."""
+    return db.scorecard_data()
+
+def compare_ingest(path: str, repeats: int = 3, workers: int = None) :
+    """
+    Compares the three-pass and single-pass JSON ingestion on a directory of scorecards,
+    checking that both produce the same tables.
+
+    Arguments:
+        path : the path to the CricSheet JSON files.
+        repeats : the number of times each strategy is timed; the best time is kept.
+        workers : the number of processes used by the single-pass reader.
+    Returns:
+        timings : a dict mapping each strategy to its best wall time, in seconds.
+    """
+    # Skip the constructor so that neither strategy gets a warm start from the other
+    db = bare_reader(path, workers)
+    timings = {}
+    results = {}
+    for name, strategy in (("three_pass", three_pass), ("single_pass", single_pass)) :
+        best = None
+        for _ in range(repeats) :
+            results[name], elapsed = time_call(strategy, db)
+            best = elapsed if best is None else min(best, elapsed)
+        timings[name] = best
+    for old, new in zip(results["three_pass"], results["single_pass"]) :
+        if not old.equals(new) :
+            raise AssertionError("single-pass ingestion produced different tables")
+    return timings
+
+def compare_scorecards(path: str, repeats: int = 3) :
+    """
+    Compares the single-pass scorecard engine with the original chain of player_match merges,
+    checking that both produce exactly the same player_match table.
+
+    Arguments:
+        path : the path to the CricSheet JSON files.
+        repeats : the number of times each strategy is timed; the best time is kept.
+    Returns:
+        timings : a dict mapping each strategy to its best wall time, in seconds.
+    """
+    db = bare_reader(path)
+    db.match, db.player, db.player_match, db.delivery, db.wickets, db.extras, db.fielder_wickets = db.scorecard_data()
+    db.encode_keys()
+    tables = db.match, db.player, db.player_match, db.delivery, db.wickets, db.extras, db.fielder_wickets
+    timings = {}
+    results = {}
+    for name in ("merge_scorecards", "player_scorecards") :
+        best = None
+        for _ in range(repeats) :
+            db.match, db.player, db.player_match, db.delivery, db.wickets, db.extras, db.fielder_wickets = tables
+            _, elapsed = time_call(getattr(db, name))
+            best = elapsed if best is None else min(best, elapsed)
+        timings[name] = best
+        results[name] = db.player_match
+    pd.testing.assert_frame_equal(results["merge_scorecards"], results["player_scorecards"])
+    return timings
+
+def compare_backends(path: str, repeats: int = 3) :
+    """
+    Compares parsing the scorecards with each installed JSON backend, checking that every
+    backend produces exactly the same rows as the standard library.
+
+    Arguments:
+        path : the path to the CricSheet JSON files.
+        repeats : the number of times each backend is timed; the best time is kept.
+    Returns:
+        timings : a dict mapping each installed backend to its best wall time, in seconds.
+    """
+    files = bare_reader(path).scorecard_files()
+    timings = {}
+    expected = None
+    for backend in reversed(data_read.JSON_BACKENDS) : # the standard library first
+        try :
+            data_read.json_decoder(backend)
+        except ImportError :
+            continue
+        best = None
+        for _ in range(repeats) :
+            rows, elapsed = time_call(data_read.parse_rows, files, backend)
+            best = elapsed if best is None else min(best, elapsed)
+        timings[backend] = best
+        if expected is None :
+            expected = rows
+        elif rows != expected :
+            raise AssertionError(f"the {backend} backend produced different rows")
+    return timings
+
+def run_stages(path: str, workers: int = None, memory: bool = False) :
+    """
+    Runs each stage of building a database from a directory of scorecards once, in the order
+    a build runs them: the per-table passes and the single pass over the JSON, each get_*
+    scorecard function, and the write of each table to SQLite.
+
+    Arguments:
+        path : the path to the CricSheet JSON files.
+        workers : the number of processes used by the single-pass reader.
+        memory : whether to trace the peak memory of each stage.
+    Returns:
+        stages : a dict mapping each stage to its seconds, rows and peak memory in bytes.
+    """
+    stages = {}
+
+    def run(name, function, rows) :
+        result, elapsed, peak = measure(function, memory)
+        stages[name] = {"seconds": elapsed, "rows": rows(result), "peak": peak}
+        return result
+
+    db = bare_reader(path, workers)
+    run("match_data", db.match_data, len)
+    run("player_data", db.player_data, lambda tables: len(tables[1]))
+    run("delivery_data", db.delivery_data, lambda tables: len(tables[0]))
+    db.match, db.player, db.player_match, db.delivery, db.wickets, db.extras, db.fielder_wickets = \
+        run("scorecard_data", db.scorecard_data, lambda tables: len(tables[3]))
+    run("encode_keys", db.encode_keys, lambda _: len(db.delivery))
+    player_match = db.player_match
+
+    # The original chain of merges behind merge_scorecards(), one get_* function at a time
+    keys = ["season", "match_number", "team_batting", "over", "number"]
+    full_extra_df = run("merge_extras", lambda: db.delivery.merge(db.extras, on=keys), len)
+    full_wickets_df = run("merge_wickets", lambda: db.delivery.merge(db.wickets, on=keys), len)
+    steps = [("get_runs_scored", ()), ("get_runs_conceded", (full_extra_df,)), ("get_fours_sixes_data", ()),
+             ("get_balls_faced", (full_extra_df,)), ("get_extras_delivered", (full_extra_df,)),
+             ("get_num_wickets", (full_wickets_df,)), ("get_batsman_out", (full_wickets_df,)),
+             ("get_batting_position", ())]
+    for name, args in steps :
+        run(name, lambda: getattr(data_read, name)(db, *args), lambda _: len(db.player_match))
+    del full_extra_df, full_wickets_df
+
+    db.player_match = player_match
+    run("get_scorecards", lambda: data_read.get_scorecards(db), lambda _: len(db.player_match))
+    run("get_delivery_state", lambda: data_read.get_delivery_state(db), lambda _: len(db.delivery))
+    del db
+
+    # CricDB times its own table writes, so only the build as a whole can be traced
+    with tempfile.TemporaryDirectory() as directory :
+        cricdb = database.CricDB(os.path.join(directory, "benchmark.db"))
+        run("create_db", lambda: cricdb.create_db(path, workers=workers), lambda _: None)
+        for table, elapsed in cricdb.load_timings.items() :
+            count = None
+            if table not in ("indexes", "summaries") :
+                count = cricdb.connection.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+            stages[f"write_{table}"] = {"seconds": elapsed, "rows": count, "peak": None}
+        cricdb.close()
+    return stages
+
+def stage_report(path: str, workers: int = None, memory: bool = True) :
+    """
+    Times each stage of building a database from a directory of scorecards (see run_stages()).
+    Tracing allocations slows the stages down several times over, so when memory is recorded
+    the stages are run a second time with tracing on, and only the untraced times are kept.
+
+    Arguments:
+        path : the path to the CricSheet JSON files.
+        workers : the number of processes used by the single-pass reader.
+        memory : whether to record the peak memory of each stage.
+    Returns:
+        report : a dict with the number of files and bytes read, the peak resident memory of
+            the process in MiB, and, under "stages", the seconds taken, rows produced, rows
+            per second and peak memory in MiB of each stage.
+    """
+    files = sorted(glob.glob(os.path.join(path, '*.json')))
+    report = {"files": len(files), "bytes": sum(os.path.getsize(filename) for filename in files), "stages": {}}
+    stages = run_stages(path, workers)
+    peaks = run_stages(path, workers, memory=True) if memory else {}
+    for name, stage in stages.items() :
+        rows = stage["rows"] if name != "create_db" else len(files)
+        peak = peaks.get(name, {}).get("peak")
+        report["stages"][name] = {"seconds": stage["seconds"], "rows": rows,
+                                  "rows_per_second": rows / stage["seconds"] if rows and stage["seconds"] > 0 else None,
+                                  "peak_mib": peak / 2**20 if peak is not None else None}
+    # ru_maxrss is in KiB on Linux
+    report["max_rss_mib"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return report
+
+def print_report(report) :
+    """Prints a stage_report() as a table."""
+    print(f"{report['files']} files, {report['bytes'] / 2**20:.1f} MiB, peak RSS {report['max_rss_mib']:.0f} MiB")
+    print(f"{'stage':>22} {'seconds':>9} {'rows':>10} {'rows/s':>12} {'peak MiB':>9}")
+    for name, stage in report["stages"].items() :
+        rows = "" if stage["rows"] is None else stage["rows"]
+        rate = "" if stage["rows_per_second"] is None else f"{stage['rows_per_second']:.0f}"
+        peak = "" if stage["peak_mib"] is None else f"{stage['peak_mib']:.1f}"
+        print(f"{name:>22} {stage['seconds']:>9.3f} {rows:>10} {rate:>12} {peak:>9}")
+
+if __name__ == "__main__" :
+    parser = argparse.ArgumentParser(description="Benchmarks building a database from CricSheet JSON files.")
+    parser.add_argument("path", help="the directory of JSON files and people.csv")
+    parser.add_argument("workers", nargs="?", type=int, help="the number of processes used to parse the files")
+    parser.add_argument("--generate", type=int, metavar="MATCHES",
+                        help="first fill path with this many synthetic matches (see synthetic.py)")
+    parser.add_argument("--seed", type=int, default=0, help="the seed for --generate")
+    parser.add_argument("--stages-only", action="store_true", help="skip the comparisons with the original passes")
+    parser.add_argument("--no-memory", action="store_true", help="don't record peak memory, which runs each stage twice")
+    parser.add_argument("--json", metavar="FILE", help="also write the stage report to FILE as JSON")
+    args = parser.parse_args()
+
+    if args.generate is not None :
+        synthetic.generate(args.path, args.generate, seed=args.seed)
+    if not args.stages_only :
+        timings = compare_ingest(args.path, workers=args.workers)
+        for name, elapsed in timings.items() :
+            print(f"{name:>12}: {elapsed:.3f}s")
+        print(f"{'speed-up':>12}: {timings['three_pass'] / timings['single_pass']:.2f}x")
+        timings = compare_scorecards(args.path)
+        for name, elapsed in timings.items() :
+            print(f"{name:>17}: {elapsed:.3f}s")
+        print(f"{'speed-up':>17}: {timings['merge_scorecards'] / timings['player_scorecards']:.2f}x")
+        timings = compare_backends(args.path)
+        for name, elapsed in timings.items() :
+            print(f"{name:>17}: {elapsed:.3f}s ({timings['json'] / elapsed:.2f}x)")
+    report = stage_report(args.path, workers=args.workers, memory=not args.no_memory)
+    print_report(report)
+    if args.json is not None :
+        with open(args.json, 'w') as f :
+            json.dump(report, f, indent=2)
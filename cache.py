@@ -0,0 +1,147 @@
+import os
+import pickle
+import tempfile
+import threading
+from collections import OrderedDict
+
+class ScorecardCache :
+    """
+    An on-disk cache of parsed scorecards, holding one pickled blob per key. The total size of
+    the cache is capped, and the least recently used blobs are evicted once it's exceeded.
+    """
+
+    def __init__ (self, directory: str, max_bytes: int) :
+        """
+        Opens the cache in a directory, creating the directory if it doesn't exist.
+
+        Arguments:
+            directory: where the cached blobs are stored
+            max_bytes: the most space the blobs may take up
+        """
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.size = sum(entry.stat().st_size for entry in os.scandir(directory) if entry.name.endswith(".pkl"))
+
+    def blob_path(self, key: str) :
+        return os.path.join(self.directory, key + ".pkl")
+
+    def get(self, key: str) :
+        """
+        Looks up a key, marking its blob as recently used.
+
+        Arguments:
+            key: the key to look up
+        Returns:
+            the cached object, or None if the key isn't cached
+        """
+        path = self.blob_path(key)
+        try :
+            with open(path, 'rb') as f :
+                value = pickle.load(f)
+        except FileNotFoundError :
+            return None
+        except (pickle.UnpicklingError, EOFError, ValueError) :
+            # A blob left half-written by a crash; drop it and parse the file again
+            self.remove(path)
+            return None
+        os.utime(path) # the modification time doubles as the last use time for eviction
+        return value
+
+    def put(self, key: str, value) :
+        """
+        Stores an object under a key, evicting old blobs if the cache grows past its cap.
+
+        Arguments:
+            key: the key to store the object under
+            value: the object to store
+        """
+        path = self.blob_path(key)
+        # Write to a temporary file first so readers never see a partial blob
+        descriptor, temporary = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(descriptor, 'wb') as f :
+            pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+        previous = os.path.getsize(path) if os.path.exists(path) else 0
+        os.replace(temporary, path)
+        self.size += os.path.getsize(path) - previous
+        if self.size > self.max_bytes :
+            self.evict()
+
+    def evict(self) :
+        """
+        Removes the least recently used blobs until the cache is back under 90% of its cap,
+        leaving some headroom so that eviction doesn't run on every put.
+        """
+        entries = [entry for entry in os.scandir(self.directory) if entry.name.endswith(".pkl")]
+        entries.sort(key=lambda entry: entry.stat().st_mtime)
+        self.size = sum(entry.stat().st_size for entry in entries)
+        for entry in entries :
+            if self.size <= self.max_bytes * 0.9 :
+                break
+            self.remove(entry.path)
+
+    def remove(self, path: str) :
+        try :
+            size = os.path.getsize(path)
+            os.remove(path)
+            self.size -= size
+        except FileNotFoundError :
+            pass
+
+class ResultCache :
+    """
+    An in-memory cache of query results, holding at most a fixed number of entries and
+    dropping the least recently used first. Safe to share between threads.
+
+    Each clear() starts a new generation. A result worked out before a clear() may be out of
+    date, so put() drops it if it's given the generation from before the result was worked out.
+    """
+
+    def __init__ (self, max_entries: int) :
+        """
+        Arguments:
+            max_entries: the most results the cache may hold
+        """
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.generation = 0
+
+    def get(self, key) :
+        """
+        Looks up a key, marking its result as recently used.
+
+        Arguments:
+            key: the key to look up
+        Returns:
+            the cached result, or None if the key isn't cached
+        """
+        with self.lock :
+            if key not in self.entries :
+                return None
+            self.entries.move_to_end(key)
+            return self.entries[key]
+
+    def put(self, key, value, generation: int = None) :
+        """
+        Stores a result under a key, dropping the least recently used result if the cache is full.
+
+        Arguments:
+            key: the key to store the result under
+            value: the result to store
+            generation: the generation the result was worked out in; if the cache has been
+                cleared since, the result isn't stored
+        """
+        with self.lock :
+            if generation is not None and generation != self.generation :
+                return
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries :
+                self.entries.popitem(last=False)
+
+    def clear(self) :
+        """Drops every cached result, and any result being worked out in the meantime."""
+        with self.lock :
+            self.entries.clear()
+            self.generation += 1
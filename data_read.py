@@ -3,37 +3,186 @@ import numpy as np
 import os
 import glob
 import json
+import gc
+import hashlib
+import math
+import mmap
+import re
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from CricBase import cache
+from CricBase import metrics
+
+# Bump whenever the rows built from a scorecard change, so cached scorecards are parsed again
+PARSER_VERSION = 2
+# Default cap on the size of the parsed scorecard cache, in bytes
+CACHE_SIZE = 1 << 30
+# JSON parsers that scorecards can be decoded with, fastest first. orjson and simdjson (the
+# pysimdjson package) are optional; the standard library's json is always there
+JSON_BACKENDS = ["orjson", "simdjson", "json"]
+# The index of scorecard metadata that filter_files() builds in the data directory, and its
+# columns. It's kept as a hidden file so it's never mistaken for a scorecard
+INDEX_FILE = ".cricbase_index.csv"
+INDEX_COLUMNS = ["path", "size", "mtime_ns", "season", "start_date", "team1", "team2", "match_type", "version"]
+# Bump whenever scan_index() would record a file differently, so indexed files are scanned again
+INDEX_VERSION = 2
+# The parts of a scorecard's info block that are read. Backends that decode lazily leave the
+# rest (officials, toss, venue and so on) undecoded
+SCORECARD_INFO = ["season", "event", "city", "dates", "outcome", "players", "registry"]
+MATCH_ATTRS = ["match_id", "season", "match_number", "city", "start_date", "winner", "batting_first", "chasing", "eliminator", "target_overs", "target_runs"]
+PLAYER_MATCH_ATTRS = ["name", "player_id", "season", "match_number", "team", "match_id"]
+DELIVERY_FEATURES = ["season", "match_number", "team_batting", "over", "number", "batter",
+                    "bowler", "non_striker", "extras", "runs", "total_runs", "wickets", "match_id"]
+WICKET_FEATURES = ["season", "match_number", "team_batting", "over", "number", "player_out", "type", "match_id"]
+EXTRA_FEATURES = ["season", "match_number", "team_batting", "over", "number", "byes", "legbyes", "noballs", "penalty", "wides", "match_id"]
+FIELDER_WICKET_FEATURES = ["season", "match_number", "team_batting", "over", "number", "id", "match_id"] # not name, which isn't necessarily unique
+# Columns added to player_match by player_scorecards()
+SCORECARD_STATS = ["runs_scored", "runs_conceded", "wides", "noballs", "fours_scored", "fours_conceded",
+                   "sixes_scored", "sixes_conceded", "balls_faced", "balls_delivered", "wickets", "out", "position"]
+# Columns added to delivery by delivery_state(), describing the state of the innings once
+# each delivery has been bowled
+DELIVERY_STATE = ["innings_runs", "innings_wickets", "legal_balls", "balls_remaining", "required_rate"]
+# Key columns stored as categoricals, grouped by the kind of key they hold so that every
+# column of the same kind shares one set of categories and therefore one set of codes
+KEY_COLUMNS = {
+    "season": {"match": ["season"], "player_match": ["season"], "delivery": ["season"],
+               "wickets": ["season"], "extras": ["season"], "fielder_wickets": ["season"]},
+    "match_number": {"match": ["match_number"], "player_match": ["match_number"], "delivery": ["match_number"],
+                     "wickets": ["match_number"], "extras": ["match_number"], "fielder_wickets": ["match_number"]},
+    "team": {"player_match": ["team"], "delivery": ["team_batting"], "wickets": ["team_batting"],
+             "extras": ["team_batting"], "fielder_wickets": ["team_batting"]},
+    "player": {"player_match": ["player_id"], "delivery": ["batter", "bowler", "non_striker"],
+               "wickets": ["player_out"], "fielder_wickets": ["id"]},
+    "name": {"player_match": ["name"]},
+    "type": {"wickets": ["type"]},
+}
+# Per-delivery counts, which always fit in 16 bits
+SMALL_INT_COLUMNS = {"delivery": ["over", "number", "extras", "runs", "total_runs", "wickets"],
+                     "wickets": ["over", "number"], "fielder_wickets": ["over", "number"],
+                     "extras": ["over", "number", "byes", "legbyes", "noballs", "penalty", "wides"]}
+# Integer types for the player_match figures when they're exported
+PLAYER_MATCH_DTYPES = {'runs_scored':'int32', 'runs_conceded':'int32',
+                       'wides':'int32', 'noballs':'int32',
+                       'fours_scored':'int32', 'fours_conceded':'int32',
+                       'sixes_scored':'int32','sixes_conceded':'int32',
+                       'balls_faced':'int32', 'balls_delivered':'int32',
+                       'wickets':'int32', 'out':'int32', 'position':'Int64'}
+# Tables built from the scorecard files, in the order scorecard_data() returns them
+SCORECARD_TABLES = {"match": MATCH_ATTRS, "player_match": PLAYER_MATCH_ATTRS, "delivery": DELIVERY_FEATURES,
+                    "wickets": WICKET_FEATURES, "extras": EXTRA_FEATURES, "fielder_wickets": FIELDER_WICKET_FEATURES}
 
 class DataRead :
-    def __init__ (self, path:str) :
+    def __init__ (self, path:str, workers:int = None, files:list = None, cache_dir:str = None,
+                  cache_size:int = CACHE_SIZE, metrics = None, json_backend:str = None,
+                  seasons:list = None, start_date:str = None, end_date:str = None, teams:list = None,
+                  match_types:list = None) :
         """
         Creates a database object implimented as a group of pandas dataframes.
         
         Arguments:
             path (str): The path to the cricbase IPL JSON files.
+            workers (int): The number of processes used to parse the JSON files. By default
+            the files are parsed in this process.
+            files (list): The scorecard files to read. By default every JSON file in path
+            is read.
+            cache_dir (str): A directory in which to cache each file's parsed rows, keyed by
+            the file's contents, so unchanged files aren't parsed again on later runs.
+            cache_size (int): The most space the cache may take up, in bytes.
+            metrics (Metrics): Where to record the time taken by each stage of reading, and
+            the rows, files and bytes it processed (see metrics.py). Nothing is recorded by default.
+            json_backend (str): The parser to decode scorecards with, one of JSON_BACKENDS. By
+            default the fastest one installed is used; all of them give the same tables.
+            seasons, start_date, end_date, teams, match_types: Only read the matches that pass
+            these filters (see filter_files()). Other files are skipped without being parsed.
         """
         self.path = path
-        self.match = self.match_data()
-        self.player, self.player_match = self.player_data()
-        self.delivery, self.wickets, self.extras, self.fielder_wickets = self.delivery_data()
+        self.workers = workers
+        self.files = files
+        self.cache = cache.ScorecardCache(cache_dir, cache_size) if cache_dir is not None else None
+        self.metrics = metrics
+        self.json_backend = json_backend_name(json_backend)
+        if any(value is not None for value in (seasons, start_date, end_date, teams, match_types)) :
+            self.files = filter_files(path, self.scorecard_files(), seasons=seasons, start_date=start_date,
+                                      end_date=end_date, teams=teams, match_types=match_types)
+        self.match, self.player, self.player_match, self.delivery, self.wickets, \
+            self.extras, self.fielder_wickets = self.scorecard_data()
+        self.encode_keys()
         self.player_scorecards()
+        self.delivery_state()
 
     
     def to_csv(self, path: str) :
         self.match.to_csv(os.path.join(path, 'match.csv'), index=False)
         self.player.to_csv(os.path.join(path, 'player.csv'), index=False)
-        p_match = self.player_match.astype({'runs_scored':'int32', 'runs_conceded':'int32',
-                                                 'wides':'int32', 'noballs':'int32',
-                                                 'fours_scored':'int32', 'fours_conceded':'int32',
-                                                 'sixes_scored':'int32','sixes_conceded':'int32', 
-                                                 'balls_faced':'int32', 'balls_delivered':'int32',
-                                                 'wickets':'int32', 'out':'int32', 'position':'Int64'}, errors='ignore')
+        p_match = self.player_match.astype(PLAYER_MATCH_DTYPES, errors='ignore')
         p_match.to_csv(os.path.join(path, 'player_match.csv'), index=False)
         self.delivery.to_csv(os.path.join(path, 'delivery.csv'), index=False)
         self.wickets.to_csv(os.path.join(path, 'wicket.csv'), index=False)
         self.extras.to_csv(os.path.join(path, 'extra.csv'), index=False)
         self.fielder_wickets.to_csv(os.path.join(path, 'fielder_wicket.csv'), index=False)
 
+    def to_parquet(self, path: str) :
+        """
+        Writes each table as a Parquet dataset in its own directory under path, partitioned by
+        season (player, which has no season, is a single file). Categorical columns are stored
+        dictionary-encoded and the player_match figures as integers. Requires pyarrow.
+
+        Arguments:
+            path (str): The directory to write to; any earlier export there is replaced.
+        """
+        for name, table in self.tables().items() :
+            if name == "player_match" :
+                table = table.astype(PLAYER_MATCH_DTYPES)
+            target = os.path.join(path, name)
+            if os.path.isdir(target) :
+                shutil.rmtree(target) # the writer adds files to a dataset rather than replacing it
+            if name == "player" or len(table) == 0 :
+                os.makedirs(target, exist_ok=True)
+                table.to_parquet(os.path.join(target, "part-0.parquet"), index=False)
+            else :
+                # Seasons mix values like 2009 and "2009/10", but a Parquet column needs one type
+                table = table.assign(season=table["season"].astype(str))
+                table.to_parquet(target, partition_cols=["season"], index=False)
+
+    @classmethod
+    def from_parquet(cls, path: str) :
+        """
+        Loads a database object from tables written by to_parquet(), without reading any
+        JSON. Seasons come back as strings.
+
+        Arguments:
+            path (str): The directory to_parquet() wrote to.
+        Returns:
+            db : the loaded DataRead object.
+        """
+        db = cls.__new__(cls)
+        db.path = path
+        db.workers = None
+        db.files = None
+        db.cache = None
+        db.metrics = None
+        db.json_backend = json_backend_name()
+        columns = dict(SCORECARD_TABLES)
+        columns["player_match"] = PLAYER_MATCH_ATTRS + SCORECARD_STATS
+        columns["delivery"] = DELIVERY_FEATURES + DELIVERY_STATE
+        for name in ["player"] + list(columns) :
+            table = pd.read_parquet(os.path.join(path, name))
+            if name in columns :
+                # Partition columns are read back last and as categoricals of their own, and
+                # rows come back grouped by season, so restore the original file order
+                table = table.assign(season=table["season"].astype(str))[columns[name]]
+                table = table.sort_values("match_id", kind="stable", ignore_index=True)
+            setattr(db, name, table)
+        db.encode_keys()
+        return db
+
+    def tables(self) :
+        """Returns a dict mapping the name of each table to its DataFrame."""
+        return {"match": self.match, "player": self.player, "player_match": self.player_match,
+                "delivery": self.delivery, "wickets": self.wickets, "extras": self.extras,
+                "fielder_wickets": self.fielder_wickets}
+
     def match_key(self, data) :
         """
         Helper function that gets the match number and season of a given scorecard file.
@@ -44,13 +193,73 @@ class DataRead :
             season : The IPL season in which the match occured.
             match_number : The IPL match number, or type of playoff game.
         """
-        season = data["info"]["season"]
-        match_number = None
-        if "match_number" in data["info"]["event"] :
-            match_number = str(data["info"]["event"]["match_number"])
-        elif "stage" in data["info"]["event"] :
-            match_number = data["info"]["event"]["stage"]
-        return season, match_number
+        return match_key(data)
+
+    def scorecard_files(self) :
+        """Returns the paths of every scorecard JSON file to be read, in a stable order."""
+        if self.files is not None :
+            return sorted(self.files)
+        return sorted(glob.glob(os.path.join(self.path, '*.json')))
+
+    def scorecard_data(self) :
+        """
+        Reads every scorecard file once, building all of the tables that come from the
+        JSON data in a single pass. If workers was set, batches of files are parsed in a
+        process pool and the results are merged back in file order, so the tables come out
+        the same as they would from a single process.
+
+        Returns:
+            match_df, player_df, player_match_df, delivery_df, wicket_df, extra_df, fielder_wicket_df :
+            the same tables returned by match_data(), player_data() and delivery_data().
+        """
+        with metrics.timed(self.metrics, "scorecard_data") as sample :
+            files = self.scorecard_files()
+            if self.cache is not None :
+                tables = merge_chunks(self.cached_chunks(files))
+            elif self.workers is None or self.workers <= 1 or len(files) < 2 :
+                # Without a pool there's nothing to ship between processes, so skip the columnar step
+                rows = parse_rows(files, self.json_backend)
+                tables = {table: pd.DataFrame(rows[table], columns=columns) for table, columns in SCORECARD_TABLES.items()}
+            else :
+                # A few batches per worker keeps the pool busy without sending a task per file
+                batch_size = math.ceil(len(files) / (self.workers * 4))
+                batches = [files[i:i + batch_size] for i in range(0, len(files), batch_size)]
+                with ProcessPoolExecutor(max_workers=self.workers) as executor :
+                    # map keeps the batch order
+                    chunks = list(executor.map(parse_files, batches, repeat(self.json_backend)))
+                tables = merge_chunks(chunks)
+            player_df = pd.read_csv(os.path.join(self.path, 'people.csv'))
+            sample["files"] = len(files)
+            sample["rows"] = sum(len(table) for table in tables.values())
+            if self.metrics is not None :
+                sample["bytes"] = sum(os.path.getsize(filename) for filename in files)
+        return (tables["match"], player_df, tables["player_match"], tables["delivery"],
+                tables["wickets"], tables["extras"], tables["fielder_wickets"])
+
+    def cached_chunks(self, files) :
+        """
+        Gets a columnar chunk for each file from the cache, parsing (and caching) only the files
+        that aren't already in it.
+
+        Arguments:
+            files : the scorecard files to read, in order.
+        Returns:
+            chunks : a chunk per file, as returned by parse_files().
+        """
+        keys = [scorecard_key(filename) for filename in files]
+        chunks = [self.cache.get(key) for key in keys]
+        missing = [i for i, chunk in enumerate(chunks) if chunk is None]
+        missing_files = [[files[i]] for i in missing]
+        if self.workers is None or self.workers <= 1 or len(missing) < 2 :
+            parsed = [parse_files(batch, self.json_backend) for batch in missing_files]
+        else :
+            with ProcessPoolExecutor(max_workers=self.workers) as executor :
+                parsed = list(executor.map(parse_files, missing_files, repeat(self.json_backend),
+                                           chunksize=math.ceil(len(missing) / (self.workers * 4))))
+        for i, chunk in zip(missing, parsed) :
+            chunks[i] = chunk
+            self.cache.put(keys[i], chunk)
+        return chunks
 
     def match_data(self) :
         """
@@ -60,33 +269,9 @@ class DataRead :
             match_df : The aforementioned Dataframe
         """
         match_data_array = []
-        match_attrs = ["season", "match_number", "city", "start_date", "winner", "batting_first", "chasing", "eliminator", "target_overs", "target_runs"]
-        for filename in glob.glob(os.path.join(self.path, '*.json')):
-            data = json.load(open(filename))
-            city = None
-            start_date = None
-            winner = None
-            eliminator = None
-            season, match_number = self.match_key(data)
-            if "city" in data["info"] :
-                city = data["info"]["city"]
-            if "dates" in data["info"] :
-                if len(data["info"]["dates"]) > 0 :
-                    start_date = data["info"]["dates"][0]
-            if "winner" in data["info"]["outcome"] :
-                winner = data["info"]["outcome"]["winner"]
-            elif "result" in data["info"]["outcome"] :
-                winner = data["info"]["outcome"]["result"]
-            if "eliminator" in data["info"]["outcome"] :
-                eliminator = data["info"]["outcome"]["eliminator"]
-
-            match_data_list = [season, match_number, city,
-                    start_date, winner, (data["innings"][0]["team"] if len(data["innings"]) > 0 else None),
-                    (data["innings"][1]["team"] if len(data["innings"]) > 1 else None), eliminator,
-                    (data["innings"][1]["target"]["overs"] if len(data["innings"]) > 1 else None),
-                    (data["innings"][1]["target"]["runs"] if len(data["innings"]) > 1 else None)]
-            match_data_array.append(match_data_list)
-        match_df = pd.DataFrame(match_data_array, columns=match_attrs)
+        for match_id, filename in enumerate(self.scorecard_files()):
+            match_data_array.append(match_row(read_scorecard(filename, self.json_backend), match_id))
+        match_df = pd.DataFrame(match_data_array, columns=MATCH_ATTRS)
         return match_df
 
     def player_data(self) :
@@ -102,20 +287,9 @@ class DataRead :
         # full_player_match_attrs = ["name", "player_id", "season", "match_number", "team", "runs_scored", "fours", "sixes", 
         #                       "out", "balls_faced", "position", "wickets", "runs_conceded", "balls_delivered",
         #                       "fours_conceded", "sixes_conceded", "wides", "no_balls"]
-        player_match_attrs = ["name", "player_id", "season", "match_number", "team"]
-        for filename in glob.glob(os.path.join(self.path, '*.json')):
-            data = json.load(open(filename))
-            season, match_number = self.match_key(data)
-            for player in data["info"]["registry"]["people"] :
-                team = None
-                for team_name in data["info"]["players"] :
-                    if player in data["info"]["players"][team_name] :
-                        team = team_name
-                if not team == None : # is an official
-                    player_match = [player, data["info"]["registry"]["people"][player], season, match_number,
-                                team]
-                    player_match_array.append(player_match)
-        player_match_df = pd.DataFrame(player_match_array, columns=player_match_attrs)
+        for match_id, filename in enumerate(self.scorecard_files()):
+            player_match_array.extend(player_match_rows(read_scorecard(filename, self.json_backend), match_id))
+        player_match_df = pd.DataFrame(player_match_array, columns=PLAYER_MATCH_ATTRS)
         return player_df, player_match_df
 
     def delivery_data(self) :
@@ -129,99 +303,731 @@ class DataRead :
             extra_df : extra information on extra (byes, wides, nbs, etc.) deliveries.
             fielder_wicket_df : maps wickets to fielders involved in the dismissal.
         """
-        delivery_array = []
-        delivery_features = ["season", "match_number", "team_batting", "over", "number", "batter",
-                            "bowler", "non_striker", "extras", "runs", "total_runs", "wickets", "match_id"]
-        wicket_array = []
-        wicket_features = ["season", "match_number", "team_batting", "over", "number", "player_out", "type"]
-        extra_array = []
-        extra_features = ["season", "match_number", "team_batting", "over", "number", "byes", "legbyes", "noballs", "penalty", "wides"]
-        fielder_wicket_array = []
-        fielder_wicket_features = ["season", "match_number", "team_batting", "over", "number", "id"] # not name, which isn't necessarily unique
-        for filename in glob.glob(os.path.join(self.path, '*.json')):
-            data = json.load(open(filename))
-            season, match_number = self.match_key(data)
-            registry = data["info"]["registry"]["people"]
-            for count, innings_data in enumerate(data["innings"]) :
-                if count > 1 : # excluding super over data bc I don't think it's needed here
-                    break
-                team_batting = innings_data["team"]
-                for over_data in innings_data["overs"] :
-                    over = over_data["over"]
-                    for number, delivery_data in enumerate(over_data["deliveries"]) :
-                        batter_name = delivery_data["batter"]
-                        batter_id = registry[batter_name]
-                        bowler_name = delivery_data["bowler"]
-                        bowler_id = registry[bowler_name]
-                        non_striker_name = delivery_data["non_striker"]
-                        non_striker_id = registry[non_striker_name]
-                        runs = delivery_data["runs"]["batter"]
-                        total_runs = delivery_data["runs"]["total"]
-                        wickets = 0
-                        extras = delivery_data["runs"]["extras"]
-
-                        if "wickets" in delivery_data :
-                            wickets = len(delivery_data["wickets"])
-                            for wicket_data in delivery_data["wickets"] :
-                                wicket_type = wicket_data["kind"]
-                                player_out_name = wicket_data["player_out"]
-                                player_out_id = registry[player_out_name]
-                                wicket_list = [season, match_number, team_batting, over, number, player_out_id, wicket_type]
-                                wicket_array.append(wicket_list)
-                                if "fielders" in wicket_data:
-                                    for fielder_data in wicket_data["fielders"] :
-                                        fielder_name = fielder_data["name"]
-                                        fielder_id = registry[fielder_name]
-                                        fielder_wicket_list = [season, match_number, team_batting, over, number, fielder_id]
-                                        fielder_wicket_array.append(fielder_wicket_list)
-                        
-                        if "extras" in delivery_data :
-                            extras_data = delivery_data["extras"]
-                            byes, legbyes, noballs, penalty, wides = 0, 0, 0, 0, 0
-                            if "byes" in extras_data :
-                                byes = extras_data["byes"]
-                            if "legbyes" in extras_data :
-                                legbyes = extras_data["legbyes"]
-                            if "noballs" in extras_data :
-                                noballs = extras_data["noballs"]
-                            if "penalty" in extras_data :
-                                penalty = extras_data["penalty"]
-                            if "wides" in extras_data :
-                                wides = extras_data["wides"]
-                            extra_list = [season, match_number, team_batting, over, number, byes, 
-                                        legbyes, noballs, penalty, wides]
-                            extra_array.append(extra_list)
-                        # In this databases, overs + deliveries are zero indexed
-                        delivery_list = [season, match_number, team_batting, over, number, batter_id, 
-                                        bowler_id, non_striker_id, extras, runs, total_runs, wickets, str(season) + " " + str(match_number)]
-                        delivery_array.append(delivery_list)
-        delivery_df = pd.DataFrame(delivery_array, columns=delivery_features)
-        wicket_df = pd.DataFrame(wicket_array, columns=wicket_features)
-        extra_df = pd.DataFrame(extra_array, columns=extra_features)
-        fielder_wicket_df = pd.DataFrame(fielder_wicket_array, columns=fielder_wicket_features)
+        delivery_array, wicket_array, extra_array, fielder_wicket_array = [], [], [], []
+        for match_id, filename in enumerate(self.scorecard_files()):
+            delivery_rows(read_scorecard(filename, self.json_backend), match_id, delivery_array, wicket_array, extra_array, fielder_wicket_array)
+        delivery_df = pd.DataFrame(delivery_array, columns=DELIVERY_FEATURES)
+        wicket_df = pd.DataFrame(wicket_array, columns=WICKET_FEATURES)
+        extra_df = pd.DataFrame(extra_array, columns=EXTRA_FEATURES)
+        fielder_wicket_df = pd.DataFrame(fielder_wicket_array, columns=FIELDER_WICKET_FEATURES)
         return delivery_df, wicket_df, extra_df, fielder_wicket_df
 
+    def encode_keys(self) :
+        """
+        Converts the key columns listed in KEY_COLUMNS to pandas categoricals, so that each
+        repeated season, match number, team, player id and dismissal type is stored once and
+        rows only hold a small integer code. Columns holding the same kind of key share their
+        categories, so their codes can be compared and joined on directly. match_id is narrowed
+        to a 32-bit integer in every table, and the per-delivery counts to 16 bits.
+        """
+        tables = {"match": self.match, "player_match": self.player_match, "delivery": self.delivery,
+                  "wickets": self.wickets, "extras": self.extras, "fielder_wickets": self.fielder_wickets}
+        with metrics.timed(self.metrics, "encode_keys", self.tables) as sample :
+            for table in tables.values() :
+                table["match_id"] = table["match_id"].astype(np.int32)
+            for table, columns in SMALL_INT_COLUMNS.items() :
+                tables[table][columns] = tables[table][columns].astype(np.int16)
+            for columns in KEY_COLUMNS.values() :
+                values = pd.concat([tables[table][column] for table in columns for column in columns[table]],
+                                   ignore_index=True)
+                dtype = pd.CategoricalDtype(pd.unique(values.dropna()))
+                for table in columns :
+                    for column in columns[table] :
+                        tables[table][column] = tables[table][column].astype(dtype)
+            sample["rows"] = sum(len(table) for table in tables.values())
+
     def player_scorecards(self) :
         """
         Extracts scorecard data for each player in each match, inserting it into the database
         object's player_match_df.
         """
-        full_extra_df = self.delivery.merge(self.extras, on=["season", "match_number", "team_batting", "over", "number"])
-        full_wickets_df = self.delivery.merge(self.wickets, on=["season", "match_number", "team_batting", "over", "number"])
-        get_runs_scored(self)
-        get_runs_conceded(self, full_extra_df)
-        get_fours_sixes_data(self)
-        get_balls_faced(self, full_extra_df)
-        get_extras_delivered(self, full_extra_df)
-        get_num_wickets(self, full_wickets_df)
-        get_batsman_out(self, full_wickets_df)
-        get_batting_position(self)
+        with metrics.timed(self.metrics, "get_scorecards", self.tables) as sample :
+            get_scorecards(self)
+            sample["rows"] = len(self.player_match)
+
+    def delivery_state(self) :
+        """
+        Adds the running state of the innings after each delivery to the database object's
+        delivery_df, as listed in DELIVERY_STATE.
+        """
+        with metrics.timed(self.metrics, "get_delivery_state", self.tables) as sample :
+            get_delivery_state(self)
+            sample["rows"] = len(self.delivery)
+
+    def merge_scorecards(self) :
+        """
+        Builds the same player_match columns as player_scorecards() by merging each get_*
+        statistic into player_match in turn. This is much slower, but is kept as a reference
+        for the single pass in get_scorecards().
+        """
+        with metrics.timed(self.metrics, "merge_deliveries") :
+            full_extra_df = self.delivery.merge(self.extras, on=["season", "match_number", "team_batting", "over", "number"])
+            full_wickets_df = self.delivery.merge(self.wickets, on=["season", "match_number", "team_batting", "over", "number"])
+        steps = [(get_runs_scored, ()), (get_runs_conceded, (full_extra_df,)), (get_fours_sixes_data, ()),
+                 (get_balls_faced, (full_extra_df,)), (get_extras_delivered, (full_extra_df,)),
+                 (get_num_wickets, (full_wickets_df,)), (get_batsman_out, (full_wickets_df,)),
+                 (get_batting_position, ())]
+        for step, args in steps :
+            with metrics.timed(self.metrics, step.__name__, self.tables) as sample :
+                step(self, *args)
+                sample["rows"] = len(self.player_match)
+
+def file_hash(filename) :
+    """Returns the SHA-256 hex digest of a file's contents."""
+    digest = hashlib.sha256()
+    with open(filename, 'rb') as f :
+        for block in iter(lambda: f.read(1 << 20), b'') :
+            digest.update(block)
+    return digest.hexdigest()
+
+def scorecard_key(filename) :
+    """Returns the cache key of a scorecard file: a hash of its contents and the parser version."""
+    return f"{file_hash(filename)}-{PARSER_VERSION}"
+
+def json_backend_name(name = None) :
+    """
+    Picks the JSON backend to decode scorecards with.
+
+    Arguments:
+        name : the backend asked for, one of JSON_BACKENDS, or None for the fastest installed.
+    Returns:
+        the name of the backend.
+    """
+    if name is not None :
+        if name not in JSON_BACKENDS :
+            raise ValueError(f"unknown JSON backend {name!r}; expected one of {JSON_BACKENDS}")
+        json_decoder(name) # fail now, rather than in a worker, if it isn't installed
+        return name
+    for backend in JSON_BACKENDS :
+        try :
+            json_decoder(backend)
+            return backend
+        except ImportError :
+            pass
+
+# Decoders that have been set up, by backend; each process sets up its own
+JSON_DECODERS = {}
+
+def json_decoder(name) :
+    """
+    Gets the function that decodes a scorecard's bytes with a backend, importing the backend
+    the first time it's asked for.
+
+    Arguments:
+        name : the backend, one of JSON_BACKENDS.
+    Returns:
+        a function taking the bytes of a scorecard and returning it as plain dicts and lists.
+    """
+    if name not in JSON_DECODERS :
+        if name == "orjson" :
+            import orjson
+            JSON_DECODERS[name] = orjson.loads
+        elif name == "simdjson" :
+            import simdjson
+            JSON_DECODERS[name] = lazy_decoder(simdjson.Parser())
+        else :
+            JSON_DECODERS[name] = json.loads
+    return JSON_DECODERS[name]
+
+def lazy_decoder(parser) :
+    """
+    Makes a decoder from a simdjson parser that only converts the parts of a scorecard that
+    are read (SCORECARD_INFO and the innings) to Python objects.
+    """
+    def plain(value) :
+        if hasattr(value, "as_dict") :
+            return value.as_dict()
+        if hasattr(value, "as_list") :
+            return value.as_list()
+        return value
+
+    def decode(raw) :
+        document = parser.parse(raw)
+        info = document["info"]
+        data = {"info": {field: plain(info[field]) for field in SCORECARD_INFO if field in info},
+                "innings": plain(document["innings"])} # a KeyError when missing, as with the other backends
+        # The parser can't be reused while any of its proxies are still around
+        del document, info
+        return data
+    return decode
+
+def read_scorecard(filename, backend = "json") :
+    """
+    Loads a single scorecard JSON file, closing it once it has been parsed. The file is
+    mapped into memory rather than read, so backends that accept a buffer decode it in place.
+
+    Arguments:
+        filename : the scorecard file.
+        backend : the JSON backend to decode it with, one of JSON_BACKENDS.
+    Returns:
+        the scorecard object.
+    """
+    decode = json_decoder(backend)
+    with open(filename, 'rb') as f :
+        if os.fstat(f.fileno()).st_size == 0 :
+            return decode(b"") # an empty file can't be mapped; let the decoder report it
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped :
+            if backend == "orjson" :
+                with memoryview(mapped) as view :
+                    return decode(view)
+            return decode(mapped[:])
+
+def scan_info(filename) :
+    """
+    Reads the info block of a scorecard without decoding its innings. CricSheet writes info
+    before innings, so only the text up to the innings is decoded; files laid out any other
+    way are decoded in full instead.
+
+    Arguments:
+        filename : the scorecard file.
+    Returns:
+        the scorecard's info object.
+    """
+    with open(filename, 'rb') as f :
+        raw = f.read()
+    found = re.search(rb'"info"\s*:\s*', raw)
+    if found is not None :
+        # The innings list, not the "innings" key of an innings victory's margin in the outcome
+        end = re.compile(rb'"innings"\s*:\s*\[').search(raw, found.end())
+        text = raw[found.end():end.start() if end is not None else len(raw)].decode("utf-8")
+        try :
+            info, _ = json.JSONDecoder().raw_decode(text)
+            if isinstance(info, dict) and "season" in info :
+                return info
+        except ValueError :
+            pass
+    # Decoded with the standard library, since lazy backends only keep the SCORECARD_INFO fields
+    return json.loads(raw)["info"]
+
+def scan_index(path, files) :
+    """
+    Gets the metadata used by filter_files() for each of a list of scorecards. The metadata is
+    kept in INDEX_FILE in the data directory, so only files that are new or have changed since
+    the last scan are read, and then only as far as their info block.
+
+    Arguments:
+        path : the path to the CricSheet JSON files.
+        files : the scorecard files to index.
+    Returns:
+        index : a DataFrame with a row of INDEX_COLUMNS for each file, in the order given.
+    """
+    index_path = os.path.join(path, INDEX_FILE)
+    known = {}
+    if os.path.exists(index_path) :
+        saved = pd.read_csv(index_path, dtype={"season": str, "start_date": str, "team1": str, "team2": str,
+                                               "match_type": str}, keep_default_na=False, na_values=[""])
+        # Indexes written before the version column existed are scanned again in full
+        saved = saved.reindex(columns=INDEX_COLUMNS)
+        known = {row[0]: row for row in saved.itertuples(index=False, name=None)}
+    rows = []
+    changed = False
+    for filename in files :
+        name = os.path.relpath(filename, path)
+        stat = os.stat(filename)
+        row = known.get(name)
+        if row is None or row[1] != stat.st_size or row[2] != stat.st_mtime_ns or row[8] != INDEX_VERSION :
+            info = scan_info(filename)
+            teams = list(info.get("teams", [])) + [None, None]
+            dates = info.get("dates", [])
+            row = (name, stat.st_size, stat.st_mtime_ns, str(info["season"]), dates[0] if len(dates) > 0 else None,
+                   teams[0], teams[1], info.get("match_type"), INDEX_VERSION)
+            changed = True
+        rows.append(row)
+    index = pd.DataFrame(rows, columns=INDEX_COLUMNS)
+    if changed :
+        # Keep what's known about files that weren't asked about this time, if they're still there
+        names = set(index["path"])
+        others = [row for name, row in known.items() if name not in names and os.path.exists(os.path.join(path, name))]
+        try :
+            pd.concat([pd.DataFrame(others, columns=INDEX_COLUMNS), index]).sort_values("path")\
+                .to_csv(index_path, index=False)
+        except OSError :
+            pass # a read-only archive just gets scanned again next time
+    return index
+
+def filter_files(path, files, seasons = None, start_date = None, end_date = None, teams = None, match_types = None) :
+    """
+    Picks out the scorecards of the matches that pass every filter given, using the index
+    from scan_index() so that no scorecard is parsed in full.
+
+    Arguments:
+        path : the path to the CricSheet JSON files.
+        files : the scorecard files to filter.
+        seasons : the seasons to keep, such as [2008, "2009/10"].
+        start_date, end_date : the first and last days to keep matches from, as YYYY-MM-DD;
+            a match is dated by the day it started.
+        teams : keep matches in which any of these teams played.
+        match_types : the match types to keep, such as ["T20"].
+    Returns:
+        the files that pass, in the order given.
+    """
+    files = list(files)
+    index = scan_index(path, files)
+    keep = pd.Series(True, index=index.index)
+    if seasons is not None :
+        keep &= index["season"].isin([str(season) for season in seasons])
+    if start_date is not None :
+        keep &= index["start_date"].notna() & (index["start_date"] >= start_date)
+    if end_date is not None :
+        keep &= index["start_date"].notna() & (index["start_date"] <= end_date)
+    if teams is not None :
+        keep &= index["team1"].isin(teams) | index["team2"].isin(teams)
+    if match_types is not None :
+        keep &= index["match_type"].isin(match_types)
+    return [filename for filename, kept in zip(files, keep.to_numpy()) if kept]
+
+def parse_rows(filenames, json_backend = "json") :
+    """
+    Parses a batch of scorecard files into rows. Each file is given a match_id equal to its
+    position in the batch.
+
+    Arguments:
+        filenames : the scorecard files to parse, in order.
+        json_backend : the JSON backend to decode them with, one of JSON_BACKENDS.
+    Returns:
+        rows : a dict mapping each table in SCORECARD_TABLES to a list of its rows.
+    """
+    match_data_array = []
+    player_match_array = []
+    delivery_array, wicket_array, extra_array, fielder_wicket_array = [], [], [], []
+    # The rows never form reference cycles, so pausing the cyclic garbage collector stops it
+    # from repeatedly rescanning every row built so far as the lists grow
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try :
+        for match_id, filename in enumerate(filenames) :
+            data = read_scorecard(filename, json_backend)
+            match_data_array.append(match_row(data, match_id))
+            player_match_array.extend(player_match_rows(data, match_id))
+            delivery_rows(data, match_id, delivery_array, wicket_array, extra_array, fielder_wicket_array)
+    finally :
+        if gc_enabled :
+            gc.enable()
+    return {"match": match_data_array, "player_match": player_match_array, "delivery": delivery_array,
+            "wickets": wicket_array, "extras": extra_array, "fielder_wickets": fielder_wicket_array}
+
+def parse_files(filenames, json_backend = "json") :
+    """
+    Parses a batch of scorecard files into columnar chunks. This runs in the worker
+    processes when DataRead is given workers, so it has to stay a module-level function.
+
+    Arguments:
+        filenames : the scorecard files to parse, in order.
+        json_backend : the JSON backend to decode them with, one of JSON_BACKENDS.
+    Returns:
+        chunk : a dict mapping each table in SCORECARD_TABLES to a dict of column name to
+        that column's values, packed by pack_column().
+    """
+    rows = parse_rows(filenames, json_backend)
+    chunk = {}
+    for table, columns in SCORECARD_TABLES.items() :
+        chunk[table] = {column: pack_column([row[i] for row in rows[table]]) for i, column in enumerate(columns)}
+    return chunk
+
+def pack_column(values) :
+    """
+    Packs a column of values compactly for sending between processes (or caching). Columns
+    pandas reads as numbers become a NumPy array, with integers in the smallest type that holds
+    them; any other column is dictionary-encoded as a tuple of integer codes and the distinct
+    values, with -1 for None.
+
+    Arguments:
+        values : the column's values, as a list.
+    Returns:
+        the packed column.
+    """
+    if len(values) == 0 :
+        return np.array([], dtype=object)
+    column = pd.Series(values)
+    if column.dtype.kind in "iu" :
+        return column.to_numpy().astype(small_int_type(column.min(), column.max()))
+    if column.dtype.kind in "fb" :
+        return column.to_numpy()
+    codes, uniques = pd.factorize(column)
+    return codes.astype(small_int_type(-1, len(uniques))), np.asarray(uniques, dtype=object)
+
+def small_int_type(low, high) :
+    """Returns the smallest signed integer type that holds every value from low to high."""
+    for dtype in (np.int8, np.int16, np.int32) :
+        if np.iinfo(dtype).min <= low and high <= np.iinfo(dtype).max :
+            return dtype
+    return np.int64
+
+def unpack_columns(parts) :
+    """
+    Concatenates the packed parts of a column, as pack_column() left them, into a single
+    array. The result has the dtype pandas would have given the column's values as a list.
+
+    Arguments:
+        parts : the packed parts of the column, in order.
+    Returns:
+        the column, as an array (or, for columns mixing numbers and text, a list).
+    """
+    parts = [part for part in parts if len(part[0] if isinstance(part, tuple) else part) > 0]
+    numeric = [part for part in parts if not isinstance(part, tuple)]
+    if len(parts) > 0 and len(numeric) == len(parts) :
+        kinds = {part.dtype.kind for part in parts}
+        if kinds == {"b"} :
+            return np.concatenate(parts)
+        if kinds <= {"i", "u", "f"} :
+            # Widened back to the types pandas would have chosen
+            return np.concatenate(parts).astype(np.float64 if "f" in kinds else np.int64)
+    values = []
+    for part in parts :
+        if isinstance(part, tuple) :
+            codes, uniques = part
+            # An extra None on the end of the distinct values lets -1 index it
+            values.append(np.append(uniques, None)[codes])
+        else :
+            values.append(np.where(pd.isna(part), None, part.astype(object)))
+    values = np.concatenate(values) if len(values) > 0 else np.array([], dtype=object)
+    if len(numeric) > 0 :
+        # Numbers mixed with text (or with columns that were all None) are left to pandas to type
+        return values.tolist()
+    return values
+
+def merge_chunks(chunks) :
+    """
+    Concatenates columnar chunks from parse_files() into DataFrames, offsetting each chunk's
+    match ids by the number of files in the chunks before it.
+
+    Arguments:
+        chunks : the chunks to merge, in file order.
+    Returns:
+        tables : a dict mapping each table in SCORECARD_TABLES to its DataFrame.
+    """
+    offsets = np.cumsum([0] + [len(chunk["match"]["match_id"]) for chunk in chunks])
+    tables = {}
+    for table, columns in SCORECARD_TABLES.items() :
+        merged = {}
+        for column in columns :
+            parts = [chunk[table][column] for chunk in chunks]
+            if column == "match_id" :
+                parts = [part.astype(np.int64) + offset for part, offset in zip(parts, offsets)]
+            merged[column] = unpack_columns(parts)
+        tables[table] = pd.DataFrame(merged, columns=columns)
+    return tables
+
+def match_key(data) :
+    """
+    Gets the match number and season of a given scorecard file.
+
+    Arguments:
+        data : the scorecard object, read from JSON.
+    Returns:
+        season : The IPL season in which the match occured.
+        match_number : The IPL match number, or type of playoff game.
+    """
+    season = data["info"]["season"]
+    match_number = None
+    if "match_number" in data["info"]["event"] :
+        match_number = str(data["info"]["event"]["match_number"])
+    elif "stage" in data["info"]["event"] :
+        match_number = data["info"]["event"]["stage"]
+    return season, match_number
+
+def match_row(data, match_id) :
+    """
+    Gets general data on match location/outcome from a scorecard.
+
+    Arguments:
+        data : the scorecard object, read from JSON.
+        match_id : the integer id given to the match.
+    Returns:
+        match_data_list : a row of the match table, ordered as MATCH_ATTRS.
+    """
+    city = None
+    start_date = None
+    winner = None
+    eliminator = None
+    season, match_number = match_key(data)
+    if "city" in data["info"] :
+        city = data["info"]["city"]
+    if "dates" in data["info"] :
+        if len(data["info"]["dates"]) > 0 :
+            start_date = data["info"]["dates"][0]
+    if "winner" in data["info"]["outcome"] :
+        winner = data["info"]["outcome"]["winner"]
+    elif "result" in data["info"]["outcome"] :
+        winner = data["info"]["outcome"]["result"]
+    if "eliminator" in data["info"]["outcome"] :
+        eliminator = data["info"]["outcome"]["eliminator"]
+
+    match_data_list = [match_id, season, match_number, city,
+            start_date, winner, (data["innings"][0]["team"] if len(data["innings"]) > 0 else None),
+            (data["innings"][1]["team"] if len(data["innings"]) > 1 else None), eliminator,
+            (data["innings"][1]["target"]["overs"] if len(data["innings"]) > 1 else None),
+            (data["innings"][1]["target"]["runs"] if len(data["innings"]) > 1 else None)]
+    return match_data_list
+
+def player_match_rows(data, match_id) :
+    """
+    Gets the players who took part in a match from a scorecard.
+
+    Arguments:
+        data : the scorecard object, read from JSON.
+        match_id : the integer id given to the match.
+    Returns:
+        player_match_array : rows of the player_match table, ordered as PLAYER_MATCH_ATTRS.
+    """
+    player_match_array = []
+    season, match_number = match_key(data)
+    for player in data["info"]["registry"]["people"] :
+        team = None
+        for team_name in data["info"]["players"] :
+            if player in data["info"]["players"][team_name] :
+                team = team_name
+        if not team == None : # is an official
+            player_match = [player, data["info"]["registry"]["people"][player], season, match_number,
+                        team, match_id]
+            player_match_array.append(player_match)
+    return player_match_array
+
+def delivery_rows(data, match_id, delivery_array, wicket_array, extra_array, fielder_wicket_array) :
+    """
+    Gets every delivery in a scorecard, appending rows to the passed lists.
+
+    Arguments:
+        data : the scorecard object, read from JSON.
+        match_id : the integer id given to the match.
+        delivery_array : rows of the delivery table, ordered as DELIVERY_FEATURES.
+        wicket_array : rows of the wicket table, ordered as WICKET_FEATURES.
+        extra_array : rows of the extra table, ordered as EXTRA_FEATURES.
+        fielder_wicket_array : rows of the fielder_wicket table, ordered as FIELDER_WICKET_FEATURES.
+    """
+    season, match_number = match_key(data)
+    registry = data["info"]["registry"]["people"]
+    for count, innings_data in enumerate(data["innings"]) :
+        if count > 1 : # excluding super over data bc I don't think it's needed here
+            break
+        team_batting = innings_data["team"]
+        for over_data in innings_data["overs"] :
+            over = over_data["over"]
+            for number, delivery_data in enumerate(over_data["deliveries"]) :
+                batter_name = delivery_data["batter"]
+                batter_id = registry[batter_name]
+                bowler_name = delivery_data["bowler"]
+                bowler_id = registry[bowler_name]
+                non_striker_name = delivery_data["non_striker"]
+                non_striker_id = registry[non_striker_name]
+                runs = delivery_data["runs"]["batter"]
+                total_runs = delivery_data["runs"]["total"]
+                wickets = 0
+                extras = delivery_data["runs"]["extras"]
+
+                if "wickets" in delivery_data :
+                    wickets = len(delivery_data["wickets"])
+                    for wicket_data in delivery_data["wickets"] :
+                        wicket_type = wicket_data["kind"]
+                        player_out_name = wicket_data["player_out"]
+                        player_out_id = registry[player_out_name]
+                        wicket_list = [season, match_number, team_batting, over, number, player_out_id, wicket_type, match_id]
+                        wicket_array.append(wicket_list)
+                        if "fielders" in wicket_data:
+                            for fielder_data in wicket_data["fielders"] :
+                                fielder_name = fielder_data["name"]
+                                fielder_id = registry[fielder_name]
+                                fielder_wicket_list = [season, match_number, team_batting, over, number, fielder_id, match_id]
+                                fielder_wicket_array.append(fielder_wicket_list)
+                
+                if "extras" in delivery_data :
+                    extras_data = delivery_data["extras"]
+                    byes, legbyes, noballs, penalty, wides = 0, 0, 0, 0, 0
+                    if "byes" in extras_data :
+                        byes = extras_data["byes"]
+                    if "legbyes" in extras_data :
+                        legbyes = extras_data["legbyes"]
+                    if "noballs" in extras_data :
+                        noballs = extras_data["noballs"]
+                    if "penalty" in extras_data :
+                        penalty = extras_data["penalty"]
+                    if "wides" in extras_data :
+                        wides = extras_data["wides"]
+                    extra_list = [season, match_number, team_batting, over, number, byes, 
+                                legbyes, noballs, penalty, wides, match_id]
+                    extra_array.append(extra_list)
+                # In this databases, overs + deliveries are zero indexed
+                delivery_list = [season, match_number, team_batting, over, number, batter_id, 
+                                bowler_id, non_striker_id, extras, runs, total_runs, wickets, match_id]
+                delivery_array.append(delivery_list)
+
+def key_codes(*columns) :
+    """
+    Dictionary-encodes columns holding the same kind of key, so that equal values get the same
+    integer code in every column. Missing values are given a code of their own, matching the
+    way merge() pairs them up. Categorical columns that already share categories (see
+    DataRead.encode_keys()) just reuse their codes.
+
+    Arguments:
+        columns : the columns to encode.
+    Returns:
+        codes : a list with an array of codes for each column.
+        n_codes : the number of distinct values.
+    """
+    dtype = columns[0].dtype
+    if isinstance(dtype, pd.CategoricalDtype) and all(column.dtype == dtype for column in columns) :
+        n_codes = len(dtype.categories)
+        # Missing values are coded -1; move them to a code of their own past the categories
+        return [np.where(codes < 0, n_codes, codes) for codes in
+                (column.cat.codes.to_numpy(dtype=np.int64) for column in columns)], n_codes + 1
+    values = pd.concat([pd.Series(column, copy=False) for column in columns], ignore_index=True)
+    codes, uniques = pd.factorize(values, use_na_sentinel=False)
+    return np.split(codes, np.cumsum([len(column) for column in columns])[:-1]), len(uniques)
+
+def ball_key(match, team, frame, n_teams) :
+    """
+    Packs the (match, team_batting, over, number) key of each row of a table into one integer.
+    Overs and deliveries within an over stay well under 4096 and 1024 respectively.
+
+    Arguments:
+        match : the match id of each row.
+        team : the code of each row's batting team, as given by key_codes().
+        frame : the table, holding over and number columns.
+        n_teams : the number of team codes.
+    Returns:
+        an array of the packed keys.
+    """
+    over = frame["over"].to_numpy(dtype=np.int64)
+    number = frame["number"].to_numpy(dtype=np.int64)
+    return ((match * n_teams + team) * 4096 + over) * 1024 + number
+
+def grouped_cumsum(values, groups, order) :
+    """
+    Takes the cumulative sum of values within each group, in the given order.
+
+    Arguments:
+        values : an array of values.
+        groups : the group of each value.
+        order : the position of each value within its group, such as its row index.
+    Returns:
+        an array holding the running total of each value's group up to and including it.
+    """
+    if len(values) == 0 :
+        return np.cumsum(values)
+    order = np.lexsort((order, groups))
+    sorted_values = values[order]
+    sorted_groups = groups[order]
+    totals = np.cumsum(sorted_values)
+    # Subtract the running total reached before each group starts
+    starts = np.flatnonzero(np.r_[True, sorted_groups[1:] != sorted_groups[:-1]])
+    before = (totals - sorted_values)[starts]
+    result = np.empty_like(totals)
+    result[order] = totals - np.repeat(before, np.diff(np.r_[starts, len(values)]))
+    return result
+
+def overs_to_balls(overs) :
+    """Converts overs written as overs.balls, such as 18.4, to a number of balls."""
+    whole = np.floor(overs)
+    return whole * 6 + np.round((overs - whole) * 10)
+
+def get_delivery_state(self) :
+    """
+    Gets the state of the innings after each delivery, adding it to delivery: the runs scored
+    and wickets fallen so far, and the number of legal balls bowled, which wides and noballs
+    don't add to. In the chasing innings, the balls remaining and the run rate required to reach
+    the target are added as well; they're left missing in the first innings, which has no target.
+    """
+    delivery, extras, match = self.delivery, self.extras, self.match
+    d_match, e_match = (table["match_id"].to_numpy(dtype=np.int64) for table in (delivery, extras))
+    chasing = match["chasing"]
+    if isinstance(delivery["team_batting"].dtype, pd.CategoricalDtype) :
+        chasing = chasing.astype(delivery["team_batting"].dtype) # so key_codes() can reuse the codes
+    (d_team, e_team, chasing), n_teams = key_codes(delivery["team_batting"], extras["team_batting"], chasing)
+    innings = d_match * n_teams + d_team
+    rows = delivery.index.to_numpy()
+
+    illegal = ((extras["wides"].to_numpy() > 0) | (extras["noballs"].to_numpy() > 0))
+    illegal = pd.Series(illegal).groupby(ball_key(e_match, e_team, extras, n_teams)).any()\
+        .reindex(ball_key(d_match, d_team, delivery, n_teams), fill_value=False).to_numpy()
+    runs = grouped_cumsum(delivery["total_runs"].to_numpy(dtype=np.int64), innings, rows)
+    wickets = grouped_cumsum(delivery["wickets"].to_numpy(dtype=np.int64), innings, rows)
+    legal_balls = grouped_cumsum((~illegal).astype(np.int64), innings, rows)
+
+    # Line each delivery up with its match's target, which only applies to the chasing team
+    matches = pd.Index(match["match_id"].to_numpy(dtype=np.int64))
+    position = matches.get_indexer(d_match)
+    chase = chasing[position] == d_team
+    target_runs = np.where(chase, match["target_runs"].to_numpy(dtype=np.float64)[position], np.nan)
+    target_balls = np.where(chase, overs_to_balls(match["target_overs"].to_numpy(dtype=np.float64))[position], np.nan)
+    balls_remaining = target_balls - legal_balls
+    with np.errstate(divide="ignore", invalid="ignore") :
+        required_rate = np.where(balls_remaining > 0, (target_runs - runs) * 6 / balls_remaining, np.nan)
+
+    delivery = delivery.copy()
+    delivery["innings_runs"] = runs.astype(np.int16)
+    delivery["innings_wickets"] = wickets.astype(np.int16)
+    delivery["legal_balls"] = legal_balls.astype(np.int16)
+    delivery["balls_remaining"] = balls_remaining
+    delivery["required_rate"] = required_rate
+    self.delivery = delivery
+
+def get_scorecards(self) :
+    """
+    Gets every batting and bowling statistic for each player in each match, adding them to
+    player_match. Matches, teams and players are joined on integer codes, the batting and bowling figures
+    each come from one grouped pass over the deliveries, and the results are joined onto
+    player_match once.
+    """
+    delivery, wickets, extras, player_match = self.delivery, self.wickets, self.extras, self.player_match
+    d_match, w_match, e_match, pm_match = (table["match_id"].to_numpy(dtype=np.int64)
+                                           for table in (delivery, wickets, extras, player_match))
+    (d_team, w_team, e_team), n_teams = key_codes(delivery["team_batting"], wickets["team_batting"], extras["team_batting"])
+    (batter, bowler, non_striker, player_out, pm_player), n_players = key_codes(
+        delivery["batter"], delivery["bowler"], delivery["non_striker"], wickets["player_out"], player_match["player_id"])
+
+    d_ball = ball_key(d_match, d_team, delivery, n_teams)
+    # Wides and noballs for each delivery; deliveries without an extras row get zeros
+    wides = extras["wides"].to_numpy()
+    noballs = extras["noballs"].to_numpy()
+    ball_extras = pd.DataFrame({"wides": wides, "noballs": noballs, "wide_balls": wides > 0, "noball_balls": noballs > 0})\
+        .groupby(ball_key(e_match, e_team, extras, n_teams)).sum().reindex(d_ball, fill_value=0)
+    ball_wickets = pd.Series((wickets["type"] != "run out").to_numpy())\
+        .groupby(ball_key(w_match, w_team, wickets, n_teams)).sum().reindex(d_ball, fill_value=0)
+
+    runs = delivery["runs"].to_numpy()
+    balls = pd.DataFrame({"runs": runs, "fours": runs == 4, "sixes": runs == 6, "balls": 1,
+                          "wides": ball_extras["wides"].to_numpy(), "noballs": ball_extras["noballs"].to_numpy(),
+                          "wide_balls": ball_extras["wide_balls"].to_numpy(),
+                          "noball_balls": ball_extras["noball_balls"].to_numpy(),
+                          "bowler_wickets": ball_wickets.to_numpy()})
+
+    batting = balls[["runs", "fours", "sixes", "balls", "wide_balls", "noball_balls"]]\
+        .groupby(d_match * n_players + batter, sort=False).sum()
+    bowling = balls.groupby(d_match * n_players + bowler, sort=False).sum()
+    out = pd.Series(1, index=np.unique(w_match * n_players + player_out))
+
+    # Batting position is the order in which players first appear at either end, striker first
+    order = np.argsort(delivery.index.to_numpy(), kind="stable")
+    appearances = pd.DataFrame({"innings": np.repeat((d_match * n_teams + d_team)[order], 2),
+                                "player": np.repeat(d_match[order] * n_players, 2) +
+                                          np.column_stack([batter[order], non_striker[order]]).ravel()})
+    appearances = appearances.drop_duplicates()
+    position = pd.Series(appearances.groupby("innings").cumcount().to_numpy() + 1, index=appearances["player"].to_numpy())
+    position = position[~position.index.duplicated()]
+
+    stats = pd.concat([
+        pd.DataFrame({"runs_scored": batting["runs"], "fours_scored": batting["fours"], "sixes_scored": batting["sixes"],
+                      "balls_faced": batting["balls"] - batting["wide_balls"] - batting["noball_balls"]}),
+        pd.DataFrame({"runs_conceded": bowling["runs"] + bowling["wides"] + bowling["noballs"],
+                      "wides": bowling["wides"], "noballs": bowling["noballs"],
+                      "fours_conceded": bowling["fours"], "sixes_conceded": bowling["sixes"],
+                      "balls_delivered": bowling["balls"] - bowling["wide_balls"] - bowling["noball_balls"],
+                      "wickets": bowling["bowler_wickets"]}),
+        out.rename("out"), position.rename("position")], axis=1)
+    stats = stats.reindex(pm_match * n_players + pm_player)
+
+    player_match = player_match.copy()
+    for column in SCORECARD_STATS :
+        values = stats[column].to_numpy(dtype=np.float64)
+        # Players who didn't bat have no position; every other missing figure is a zero
+        player_match[column] = values if column == "position" else np.nan_to_num(values)
+    self.player_match = player_match
 
 def get_runs_scored(self) :
     """Gets the runs scored by each batsman in each match, adding this to player_match."""
     # The runs scored per ball corresponds directly to the runs field of each delivery
     runs_scored = self.delivery[["season", "match_number", "batter", "runs"]]\
-        .groupby(by=["season", "match_number", "batter"], sort=False, as_index=False).sum()
+        .groupby(by=["season", "match_number", "batter"], sort=False, as_index=False, observed=True).sum()
     self.player_match = self.player_match.merge(runs_scored, how="left", 
                                                 left_on=["season", "match_number", "player_id"], 
                                                 right_on=["season", "match_number", "batter"])
@@ -235,9 +1041,9 @@ def get_runs_conceded(self, full_extra_df) :
         full_extra_df: extra_df inner joined with delivery_df
     """
     runs_conceded = self.delivery[["season", "match_number", "bowler", "runs"]]\
-        .groupby(by=["season", "match_number", "bowler"], sort=False, as_index=False).sum()
+        .groupby(by=["season", "match_number", "bowler"], sort=False, as_index=False, observed=True).sum()
     all_extras_conceded = full_extra_df[["season", "match_number", "bowler", "byes", "legbyes", "noballs", "penalty", "wides"]]\
-        .groupby(by=["season", "match_number", "bowler"], sort=False, as_index=False).sum()
+        .groupby(by=["season", "match_number", "bowler"], sort=False, as_index=False, observed=True).sum()
     all_wides_noballs_conceded = all_extras_conceded[["season", "match_number", "bowler", "wides", "noballs"]]
     all_runs_conceded = runs_conceded.merge(all_wides_noballs_conceded, 
                                             on=["season", "match_number", "bowler"], 
@@ -255,16 +1061,16 @@ def get_fours_sixes_data(self) :
     all_sixes = self.delivery.loc[np.where(self.delivery["runs"] == 6)]
 
     fours_scored = all_fours[["season", "match_number", "batter", "runs"]]\
-        .groupby(by=["season", "match_number", "batter"], sort=False, as_index=False).count()
+        .groupby(by=["season", "match_number", "batter"], sort=False, as_index=False, observed=True).count()
     fours_scored = fours_scored.rename(columns={"runs":"fours_scored"})
     sixes_scored = all_sixes[["season", "match_number", "batter", "runs"]]\
-        .groupby(by=["season", "match_number", "batter"], sort=False, as_index=False).count()
+        .groupby(by=["season", "match_number", "batter"], sort=False, as_index=False, observed=True).count()
     sixes_scored = sixes_scored.rename(columns={"runs":"sixes_scored"})
     fours_conceded = all_fours[["season", "match_number", "bowler", "runs"]]\
-        .groupby(by=["season", "match_number", "bowler"], sort=False, as_index=False).count()
+        .groupby(by=["season", "match_number", "bowler"], sort=False, as_index=False, observed=True).count()
     fours_conceded = fours_conceded.rename(columns={"runs":"fours_conceded"})
     sixes_conceded = all_sixes[["season", "match_number", "bowler", "runs"]]\
-        .groupby(by=["season", "match_number", "bowler"], sort=False, as_index=False).count()
+        .groupby(by=["season", "match_number", "bowler"], sort=False, as_index=False, observed=True).count()
     sixes_conceded = sixes_conceded.rename(columns={"runs":"sixes_conceded"})
 
     self.player_match = self.player_match.merge(fours_scored, 
@@ -291,14 +1097,14 @@ def get_balls_faced(self, full_extra_df) :
         full_extra_df: extra_df inner joined with delivery_df
     """
     total_balls_faced = self.delivery[["season", "match_number", "batter", "runs"]]\
-        .groupby(by=["season", "match_number", "batter"], sort=False, as_index=False).count()
+        .groupby(by=["season", "match_number", "batter"], sort=False, as_index=False, observed=True).count()
     total_balls_faced = total_balls_faced.rename(columns={"runs":"balls_faced"})
     wides_faced = full_extra_df[["season", "match_number", "batter", "wides"]].loc[np.where(full_extra_df["wides"] > 0)]
     noballs_faced = full_extra_df[["season", "match_number", "batter", "noballs"]].loc[np.where(full_extra_df["noballs"] > 0)]
     
     # Get counts for wides and noballs grouped by batter
-    total_wides_faced = wides_faced.groupby(by=["season", "match_number", "batter"], sort=False, as_index=False).count()
-    total_noballs_faced = noballs_faced.groupby(by=["season", "match_number", "batter"], sort=False, as_index=False).count()
+    total_wides_faced = wides_faced.groupby(by=["season", "match_number", "batter"], sort=False, as_index=False, observed=True).count()
+    total_noballs_faced = noballs_faced.groupby(by=["season", "match_number", "batter"], sort=False, as_index=False, observed=True).count()
     total_balls_faced = total_balls_faced.merge(total_wides_faced, how="left", on=["season", "match_number", "batter"])
     total_balls_faced = total_balls_faced.merge(total_noballs_faced, how="left", on=["season", "match_number", "batter"])
     total_balls_faced = total_balls_faced.fillna(0)
@@ -319,7 +1125,7 @@ def get_num_wickets(self, full_wickets_df) :
     """
     bowler_wickets = full_wickets_df.loc[np.where(full_wickets_df["type"] != "run out")]
     wickets_taken = bowler_wickets[["season", "match_number", "bowler", "wickets"]]\
-        .groupby(by=["season", "match_number", "bowler"], sort=False, as_index=False).count()
+        .groupby(by=["season", "match_number", "bowler"], sort=False, as_index=False, observed=True).count()
     self.player_match = self.player_match.merge(wickets_taken, 
                                             how="left", left_on=["season", "match_number", "player_id"], 
                                             right_on=["season", "match_number", "bowler"])
@@ -333,7 +1139,7 @@ def get_batsman_out(self, full_wickets_df) :
         full_wickets_df: wicket_df inner joined with delivery_df
     """
     batsman_out = full_wickets_df[["season", "match_number", "player_out", "wickets"]]\
-        .groupby(by=["season", "match_number", "player_out"], sort=False, as_index=False).count()
+        .groupby(by=["season", "match_number", "player_out"], sort=False, as_index=False, observed=True).count()
     batsman_out = batsman_out.rename(columns={"wickets":"out"})
     batsman_out["out"] = 1
     self.player_match = self.player_match.merge(batsman_out, 
@@ -350,9 +1156,10 @@ def get_batting_position(self) :
     delivery_df_chopped_ns = delivery_df_chopped_ns.rename(columns={"non_striker":"batter"})
     delivery_df_chopped = pd.concat([delivery_df_chopped, delivery_df_chopped_ns], axis=0)
     # sort_index puts the deliveries in order for each match, then cumcount() gets the position
-    # of each batter
-    player_position = delivery_df_chopped.sort_index()[["season", "match_number", "team_batting", "batter"]].drop_duplicates()
-    player_position["position"] = player_position.groupby(by=["season", "match_number", "team_batting"]).cumcount()
+    # of each batter. The sort has to be stable so the striker stays ahead of the non-striker
+    # on the same delivery; otherwise openers can swap depending on the size of the table
+    player_position = delivery_df_chopped.sort_index(kind="stable")[["season", "match_number", "team_batting", "batter"]].drop_duplicates()
+    player_position["position"] = player_position.groupby(by=["season", "match_number", "team_batting"], observed=True).cumcount()
     player_position["position"] += 1 # not zero-indexed as a standard, unlike delivery
     player_position = player_position.drop(["team_batting"], axis=1)
     self.player_match = self.player_match.merge(player_position, 
@@ -368,12 +1175,12 @@ def get_extras_delivered(self, full_extra_df) :
         full_extra_df: extra_df inner joined with delivery_df
     """
     total_balls_delivered = self.delivery[["season", "match_number", "bowler", "runs"]].groupby(by=["season", "match_number", "bowler"], 
-                                                                                                sort=False, as_index=False).count()
+                                                                                                sort=False, as_index=False, observed=True).count()
     total_balls_delivered = total_balls_delivered.rename(columns={"runs":"balls_delivered"})
     wides_delivered = full_extra_df[["season", "match_number", "bowler", "wides"]].loc[np.where(full_extra_df["wides"] > 0)]
     noballs_delivered = full_extra_df[["season", "match_number", "bowler", "noballs"]].loc[np.where(full_extra_df["noballs"] > 0)]
-    total_wides_delivered = wides_delivered.groupby(by=["season", "match_number", "bowler"], sort=False, as_index=False).count()
-    total_noballs_delivered = noballs_delivered.groupby(by=["season", "match_number", "bowler"], sort=False, as_index=False).count()
+    total_wides_delivered = wides_delivered.groupby(by=["season", "match_number", "bowler"], sort=False, as_index=False, observed=True).count()
+    total_noballs_delivered = noballs_delivered.groupby(by=["season", "match_number", "bowler"], sort=False, as_index=False, observed=True).count()
     
     total_balls_delivered = total_balls_delivered.merge(total_wides_delivered, 
                                                         how="left", on=["season", "match_number", "bowler"])
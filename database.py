@@ -1,45 +1,867 @@
 import sqlite3
+import glob
+import os
+import queue
+import threading
+import time
+from contextlib import closing, contextmanager
+from urllib.request import pathname2url
 from CricBase import data_read
+from CricBase import cache
+from CricBase import metrics
 import pandas as pd
 from pandas.io import sql
 
+# Tables holding rows for individual matches, keyed by match_id
+MATCH_TABLES = ["match", "player_match", "delivery", "wickets", "extras", "fielder_wickets"]
+# The CricSheet registry of people, which fills the player table
+PEOPLE_FILE = "people.csv"
+# Columns of each match table holding team names, which are stored as ids from the team table
+TEAM_COLUMNS = {"match": ["batting_first", "chasing"], "player_match": ["team"], "delivery": ["team_batting"],
+                "wickets": ["team_batting"], "extras": ["team_batting"], "fielder_wickets": ["team_batting"]}
+# Columns of each match table holding CricSheet registry identifiers, which are stored as
+# integer player_ids from the player table
+PLAYER_COLUMNS = {"match": [], "player_match": ["player_id"], "delivery": ["batter", "bowler", "non_striker"],
+                  "wickets": ["player_out"], "extras": [], "fielder_wickets": ["id"]}
+
+# Totals kept by each of the player summary tables, summed over player_match. The rates are
+# derived from the totals and left NULL where there's nothing to divide by
+SUMMARY_COLUMNS = """
+        matches INTEGER,
+        innings INTEGER,
+        runs_scored INTEGER,
+        balls_faced INTEGER,
+        fours_scored INTEGER,
+        sixes_scored INTEGER,
+        outs INTEGER,
+        runs_conceded INTEGER,
+        balls_delivered INTEGER,
+        wickets INTEGER,
+        wides INTEGER,
+        noballs INTEGER,
+        fours_conceded INTEGER,
+        sixes_conceded INTEGER,
+        batting_average REAL,
+        strike_rate REAL,
+        economy REAL"""
+SUMMARY_STATS = """COUNT(*), COUNT(pm.position), SUM(pm.runs_scored), SUM(pm.balls_faced), SUM(pm.fours_scored),
+        SUM(pm.sixes_scored), SUM(pm.out), SUM(pm.runs_conceded), SUM(pm.balls_delivered), SUM(pm.wickets), SUM(pm.wides),
+        SUM(pm.noballs), SUM(pm.fours_conceded), SUM(pm.sixes_conceded),
+        1.0 * SUM(pm.runs_scored) / NULLIF(SUM(pm.out), 0),
+        100.0 * SUM(pm.runs_scored) / NULLIF(SUM(pm.balls_faced), 0),
+        6.0 * SUM(pm.runs_conceded) / NULLIF(SUM(pm.balls_delivered), 0)"""
+
+# Table definitions, following the design at https://dbdiagram.io/d/Cricket-Database-Design-66569b02b65d933879efa970.
+# The player table is defined separately by player_schema(), since its columns come from people.csv
+SCHEMA = {
+    "team": """CREATE TABLE team (
+        team_id INTEGER PRIMARY KEY,
+        name TEXT NOT NULL UNIQUE)""",
+    "match": """CREATE TABLE match (
+        match_id INTEGER PRIMARY KEY,
+        season TEXT,
+        match_number TEXT,
+        city TEXT,
+        start_date TEXT,
+        winner TEXT,
+        batting_first INTEGER REFERENCES team (team_id),
+        chasing INTEGER REFERENCES team (team_id),
+        eliminator TEXT,
+        target_overs REAL,
+        target_runs INTEGER)""",
+    "player_match": """CREATE TABLE player_match (
+        match_id INTEGER NOT NULL REFERENCES match (match_id),
+        player_id INTEGER NOT NULL REFERENCES player (player_id),
+        name TEXT,
+        team INTEGER REFERENCES team (team_id),
+        runs_scored INTEGER,
+        runs_conceded INTEGER,
+        wides INTEGER,
+        noballs INTEGER,
+        fours_scored INTEGER,
+        fours_conceded INTEGER,
+        sixes_scored INTEGER,
+        sixes_conceded INTEGER,
+        balls_faced INTEGER,
+        balls_delivered INTEGER,
+        wickets INTEGER,
+        out INTEGER,
+        position INTEGER,
+        PRIMARY KEY (match_id, player_id))""",
+    "delivery": """CREATE TABLE delivery (
+        match_id INTEGER NOT NULL REFERENCES match (match_id),
+        team_batting INTEGER NOT NULL REFERENCES team (team_id),
+        over INTEGER NOT NULL,
+        number INTEGER NOT NULL,
+        batter INTEGER REFERENCES player (player_id),
+        bowler INTEGER REFERENCES player (player_id),
+        non_striker INTEGER REFERENCES player (player_id),
+        extras INTEGER,
+        runs INTEGER,
+        total_runs INTEGER,
+        wickets INTEGER,
+        innings_runs INTEGER,
+        innings_wickets INTEGER,
+        legal_balls INTEGER,
+        balls_remaining INTEGER,
+        required_rate REAL,
+        PRIMARY KEY (match_id, team_batting, over, number))""",
+    "wickets": """CREATE TABLE wickets (
+        match_id INTEGER NOT NULL,
+        team_batting INTEGER NOT NULL,
+        over INTEGER NOT NULL,
+        number INTEGER NOT NULL,
+        player_out INTEGER NOT NULL REFERENCES player (player_id),
+        type TEXT,
+        PRIMARY KEY (match_id, team_batting, over, number, player_out),
+        FOREIGN KEY (match_id, team_batting, over, number) REFERENCES delivery (match_id, team_batting, over, number))""",
+    "extras": """CREATE TABLE extras (
+        match_id INTEGER NOT NULL,
+        team_batting INTEGER NOT NULL,
+        over INTEGER NOT NULL,
+        number INTEGER NOT NULL,
+        byes INTEGER,
+        legbyes INTEGER,
+        noballs INTEGER,
+        penalty INTEGER,
+        wides INTEGER,
+        PRIMARY KEY (match_id, team_batting, over, number),
+        FOREIGN KEY (match_id, team_batting, over, number) REFERENCES delivery (match_id, team_batting, over, number))""",
+    # A wicket can be credited to several fielders, so there's no natural key here
+    "fielder_wickets": """CREATE TABLE fielder_wickets (
+        match_id INTEGER NOT NULL,
+        team_batting INTEGER NOT NULL,
+        over INTEGER NOT NULL,
+        number INTEGER NOT NULL,
+        id INTEGER REFERENCES player (player_id),
+        FOREIGN KEY (match_id, team_batting, over, number) REFERENCES delivery (match_id, team_batting, over, number))""",
+    # Summary tables, kept up to date by refresh_summaries()
+    "player_season": f"""CREATE TABLE player_season (
+        player_id INTEGER NOT NULL REFERENCES player (player_id),
+        season TEXT NOT NULL,{SUMMARY_COLUMNS},
+        PRIMARY KEY (player_id, season))""",
+    "player_team": f"""CREATE TABLE player_team (
+        player_id INTEGER NOT NULL REFERENCES player (player_id),
+        team INTEGER NOT NULL REFERENCES team (team_id),{SUMMARY_COLUMNS},
+        PRIMARY KEY (player_id, team))""",
+    "player_career": f"""CREATE TABLE player_career (
+        player_id INTEGER PRIMARY KEY REFERENCES player (player_id),{SUMMARY_COLUMNS})""",
+    "head_to_head": """CREATE TABLE head_to_head (
+        batter INTEGER NOT NULL REFERENCES player (player_id),
+        bowler INTEGER NOT NULL REFERENCES player (player_id),
+        balls INTEGER,
+        runs INTEGER,
+        fours INTEGER,
+        sixes INTEGER,
+        dismissals INTEGER,
+        strike_rate REAL,
+        PRIMARY KEY (batter, bowler))""",
+    "manifest": """CREATE TABLE manifest (
+        path TEXT PRIMARY KEY,
+        size INTEGER,
+        mtime REAL,
+        hash TEXT,
+        match_id INTEGER REFERENCES match (match_id))""",
+}
+# How each summary table is filled: the match table it summarises, and the query over it. {source} is replaced by the rows to summarise, so the same query serves both a
+# full rebuild and a refresh of a few players
+SUMMARIES = {
+    "player_season": ("player_match", f"""SELECT pm.player_id, m.season, {SUMMARY_STATS}
+        FROM {{source}} JOIN match m ON m.match_id = pm.match_id
+        GROUP BY pm.player_id, m.season"""),
+    "player_team": ("player_match", f"""SELECT pm.player_id, pm.team, {SUMMARY_STATS}
+        FROM {{source}} WHERE pm.team IS NOT NULL
+        GROUP BY pm.player_id, pm.team"""),
+    "player_career": ("player_match", f"""SELECT pm.player_id, {SUMMARY_STATS}
+        FROM {{source}}
+        GROUP BY pm.player_id"""),
+    # Balls and dismissals are counted as in player_match: wides and noballs aren't balls faced,
+    # and run outs aren't credited to the bowler
+    "head_to_head": ("delivery", """SELECT d.batter, d.bowler,
+        SUM(COALESCE(e.wides, 0) = 0 AND COALESCE(e.noballs, 0) = 0), SUM(d.runs), SUM(d.runs = 4), SUM(d.runs = 6),
+        COUNT(w.player_out), 100.0 * SUM(d.runs) / NULLIF(SUM(COALESCE(e.wides, 0) = 0 AND COALESCE(e.noballs, 0) = 0), 0)
+        FROM {source}
+        LEFT JOIN extras e ON e.match_id = d.match_id AND e.team_batting = d.team_batting
+            AND e.over = d.over AND e.number = d.number
+        LEFT JOIN wickets w ON w.match_id = d.match_id AND w.team_batting = d.team_batting
+            AND w.over = d.over AND w.number = d.number AND w.player_out = d.batter AND w.type != 'run out'
+        GROUP BY d.batter, d.bowler"""),
+}
+# For each summarised table: the temporary table of keys being refreshed and its columns, then
+# the rows to summarise, either all of them or only those matching the keys
+SUMMARY_SOURCES = {
+    "player_match": ("temp.summary_players", ["player_id"], "player_match pm",
+                     "temp.summary_players k JOIN player_match pm ON pm.player_id = k.player_id"),
+    "delivery": ("temp.summary_pairs", ["batter", "bowler"], "delivery d",
+                 "temp.summary_pairs k JOIN delivery d ON d.batter = k.batter AND d.bowler = k.bowler"),
+}
+
+# Pragmas set while bulk loading: the rollback journal is kept in memory, nothing is synced to
+# disk until the load has finished, and the page cache is raised to 256 MiB
+LOAD_PRAGMAS = {"journal_mode": "MEMORY", "synchronous": "OFF", "cache_size": -262144}
+# Pragmas set while updating a database in place. Its journal stays on disk and is synced, so
+# a crash part way through leaves the database as it was; only the page cache is raised
+UPDATE_PRAGMAS = {"synchronous": "NORMAL", "cache_size": -262144}
+# Secondary indexes, created once the tables have been loaded. The trailing columns let the
+# common per-player lookups be answered from the index alone
+INDEXES = [
+    "CREATE INDEX delivery_batter ON delivery (batter, match_id, runs)",
+    "CREATE INDEX delivery_bowler ON delivery (bowler, match_id, total_runs, wickets)",
+    "CREATE INDEX player_match_player ON player_match (player_id, match_id)",
+    "CREATE INDEX match_season ON match (season, match_number)",
+    "CREATE INDEX wickets_player_out ON wickets (player_out)",
+    "CREATE INDEX fielder_wickets_delivery ON fielder_wickets (match_id, team_batting, over, number)",
+    "CREATE INDEX fielder_wickets_id ON fielder_wickets (id)",
+    "CREATE INDEX head_to_head_bowler ON head_to_head (bowler, batter)",
+]
+
+# Players are stored by player_id, but the query methods take and return registry identifiers
+PLAYER_ID = "(SELECT player_id FROM player WHERE identifier = ?)"
+HEAD_TO_HEAD = """SELECT b.identifier AS batter, w.identifier AS bowler, h.balls, h.runs, h.fours, h.sixes,
+        h.dismissals, h.strike_rate
+        FROM head_to_head h JOIN player b ON b.player_id = h.batter JOIN player w ON w.player_id = h.bowler"""
+# Queries behind the read-only query methods of CricDB. Every value is bound as a parameter, so
+# each pooled connection prepares a statement once and reuses it from its statement cache
+QUERIES = {
+    "player_scorecard": f"""SELECT m.season, m.match_number, m.start_date, pm.match_id, pm.name, t.name AS team,
+        pm.runs_scored, pm.balls_faced, pm.fours_scored, pm.sixes_scored, pm.out, pm.position,
+        pm.runs_conceded, pm.balls_delivered, pm.wickets, pm.wides, pm.noballs, pm.fours_conceded, pm.sixes_conceded
+        FROM player_match pm JOIN match m ON m.match_id = pm.match_id LEFT JOIN team t ON t.team_id = pm.team
+        WHERE pm.player_id = {PLAYER_ID} ORDER BY pm.match_id""",
+    "player_season_scorecard": f"""SELECT m.season, m.match_number, m.start_date, pm.match_id, pm.name, t.name AS team,
+        pm.runs_scored, pm.balls_faced, pm.fours_scored, pm.sixes_scored, pm.out, pm.position,
+        pm.runs_conceded, pm.balls_delivered, pm.wickets, pm.wides, pm.noballs, pm.fours_conceded, pm.sixes_conceded
+        FROM player_match pm JOIN match m ON m.match_id = pm.match_id LEFT JOIN team t ON t.team_id = pm.team
+        WHERE pm.player_id = {PLAYER_ID} AND m.season = ? ORDER BY pm.match_id""",
+    # Deliveries were inserted in the order they were bowled, so rowid order is ball order
+    "match_deliveries": """SELECT t.name AS team_batting, d.over, d.number, b.identifier AS batter,
+        w.identifier AS bowler, n.identifier AS non_striker, d.extras, d.runs, d.total_runs, d.wickets,
+        d.innings_runs, d.innings_wickets, d.legal_balls, d.balls_remaining, d.required_rate
+        FROM delivery d JOIN team t ON t.team_id = d.team_batting LEFT JOIN player b ON b.player_id = d.batter
+        LEFT JOIN player w ON w.player_id = d.bowler LEFT JOIN player n ON n.player_id = d.non_striker
+        WHERE d.match_id = ? ORDER BY d.rowid""",
+    "head_to_head": f"{HEAD_TO_HEAD} WHERE h.batter = {PLAYER_ID} AND h.bowler = {PLAYER_ID}",
+    "batter_head_to_head": f"{HEAD_TO_HEAD} WHERE h.batter = {PLAYER_ID} ORDER BY h.balls DESC",
+    "bowler_head_to_head": f"{HEAD_TO_HEAD} WHERE h.bowler = {PLAYER_ID} ORDER BY h.balls DESC",
+}
+# Columns of player_season that season_leaders() can rank players by
+LEADER_STATS = ["matches", "innings", "runs_scored", "balls_faced", "fours_scored", "sixes_scored", "outs",
+                "runs_conceded", "balls_delivered", "wickets", "wides", "noballs", "fours_conceded",
+                "sixes_conceded", "batting_average", "strike_rate", "economy"]
+# The number of prepared statements each pooled connection keeps
+STATEMENT_CACHE = 64
+
+def file_batches(files, batch_size) :
+    """
+    Splits a list of files into batches.
+
+    Arguments:
+        files: the files to split
+        batch_size: the largest number of files in a batch, or None for a single batch
+    Returns:
+        a list of the batches, each a list of files
+    """
+    if batch_size is None :
+        return [files] if len(files) > 0 else []
+    return [files[i:i + batch_size] for i in range(0, len(files), batch_size)]
+
+def scorecard_files(path: str, filters: dict) :
+    """
+    Lists the scorecard files in a directory, in order, keeping only those that pass the given
+    filters (see data_read.filter_files()).
+
+    Arguments:
+        path: the path to the CricSheet JSON files
+        filters: keyword arguments for data_read.filter_files()
+    Returns:
+        a list of the files
+    """
+    files = sorted(glob.glob(os.path.join(path, '*.json')))
+    if any(value is not None for value in filters.values()) :
+        files = data_read.filter_files(path, files, **filters)
+    return files
+
+def sql_rows(table) :
+    """
+    Converts a DataFrame to rows of plain Python values that sqlite3 can bind directly, with
+    None in place of missing values.
+
+    Arguments:
+        table: the DataFrame to convert
+    Returns:
+        a list with a tuple for each row of the table
+    """
+    columns = []
+    for name in table.columns :
+        values = table[name].tolist()
+        if table[name].hasnans :
+            values = [None if pd.isna(value) else value for value in values]
+        columns.append(values)
+    return list(zip(*columns))
+
+def player_schema(columns) :
+    """
+    Builds the definition of the player table, keyed by an integer player_id with the CricSheet
+    registry identifier alongside it.
+
+    Arguments:
+        columns: the columns of people.csv
+    Returns:
+        the CREATE TABLE statement for the player table
+    """
+    # The other people.csv columns are left untyped so their values are stored as read
+    others = "".join(f',\n        "{column}"' for column in columns if column not in ("identifier", "player_id"))
+    return f"""CREATE TABLE player (
+        player_id INTEGER PRIMARY KEY,
+        identifier TEXT NOT NULL UNIQUE{others})"""
+
+class ReadPool :
+    """
+    A pool of read-only connections to a database, which can be shared between threads. Up to
+    size connections are opened as they're needed, and each is used by one thread at a time.
+    """
+
+    def __init__ (self, dbpath, size: int) :
+        """
+        Arguments:
+            dbpath: the location of the database
+            size: the most connections to open
+        """
+        self.uri = "file:" + pathname2url(os.path.abspath(dbpath)) + "?mode=ro"
+        self.size = size
+        self.opened = 0
+        self.idle = queue.LifoQueue()
+        self.lock = threading.Lock()
+
+    @contextmanager
+    def connection(self) :
+        """
+        Lends out a connection for the duration of a with block, waiting for one to be returned
+        if the pool is exhausted.
+        """
+        connection = None
+        # None in the idle queue stands for a slot given back by a failed open
+        while connection is None :
+            try :
+                connection = self.idle.get_nowait()
+            except queue.Empty :
+                with self.lock :
+                    create = self.opened < self.size
+                    if create :
+                        self.opened += 1
+                if not create :
+                    connection = self.idle.get()
+                    continue
+                try :
+                    connection = self.open()
+                except Exception :
+                    # Give the slot back, or the pool would shrink with every failed open, and
+                    # wake any thread waiting for a connection so it can try opening one itself
+                    with self.lock :
+                        self.opened -= 1
+                    self.idle.put(None)
+                    raise
+        try :
+            yield connection
+        finally :
+            self.idle.put(connection)
+
+    def open(self) :
+        # The connection is only used by one thread at a time, but not always the one that opened it
+        return sqlite3.connect(self.uri, uri=True, check_same_thread=False, cached_statements=STATEMENT_CACHE)
+
+    def close(self) :
+        """Closes every connection that isn't currently lent out."""
+        while True :
+            try :
+                connection = self.idle.get_nowait()
+            except queue.Empty :
+                break
+            if connection is not None :
+                connection.close()
+
 class CricDB :
     """An object for initializing a cricket database"""
 
-    def __init__ (self, dbpath) :
+    def __init__ (self, dbpath, pool_size: int = 4, cache_entries: int = 256, metrics = None) :
         """
         Initializes a connection to the database; if it doesn't exist, creates one at the
         specified path
 
         Arguments:
             dbpath: the (desired) location of the database
+            pool_size: the most read-only connections the query methods may open
+            cache_entries: the most query results to keep cached
+            metrics: a Metrics object in which to record the time taken by each stage of
+                create_db() and update_db(), and the rows and files they processed
         """
+        self.dbpath = dbpath
+        self.metrics = metrics
         self.connection = sqlite3.connect(dbpath)
+        # Seconds spent writing each table during the last create_db() or update_db()
+        self.load_timings = {}
+        # The read-only pool is opened by the first query, so databases that are only ever
+        # built never switch to WAL mode
+        self.pool = None
+        self.pool_size = pool_size
+        self.pool_lock = threading.Lock()
+        self.results = cache.ResultCache(cache_entries)
+        # The data_version each pooled connection last saw
+        self.data_versions = {}
 
-    def create_db(self, path: str) :
+    def create_db(self, path: str, workers: int = None, batch_size: int = None, cache_dir: str = None, **filters) :
         """
         Creates the database at the earlier specified location with data from the provided
-        path
+        path. Each table is loaded in its own transaction with the LOAD_PRAGMAS settings, and
+        the time taken by each is left in load_timings. The summary tables are then built from
+        the loaded matches.
+
+        If batch_size is given, the files are read and written batch_size at a time, so only
+        one batch's DataFrames are ever in memory and peak memory use doesn't grow with the
+        size of the archive. Every player_match figure comes from a single match, so building
+        them a batch at a time gives the same result as building them all at once.
         Arguments:
             path: the path from which to retrieve JSON data
+            workers: the number of processes used to parse the JSON data
+            batch_size: the number of files to read at a time
+            cache_dir: a directory in which to cache parsed scorecards between builds
+            filters: seasons, start_date, end_date, teams or match_types, as taken by
+                data_read.filter_files(), to build the database from only some of the matches
+        """
+        cursor = self.connection.cursor()
+        self.load_timings = {}
+
+        # to_sql can't declare keys, so the tables are created up front and only appended to.
+        # Secondary indexes are left until the data is in, which is faster than keeping them
+        # up to date row by row
+        for table in ["player"] + list(SCHEMA) :
+            cursor.execute(f"DROP TABLE IF EXISTS {table}")
+        for ddl in SCHEMA.values() :
+            cursor.execute(ddl)
+        files = scorecard_files(path, filters)
+        with metrics.timed(self.metrics, "create_db") as sample, self.bulk_load() :
+            # Written up front, so it's loaded even when no scorecards are
+            self.write_players(path, commit=True)
+            for batch in file_batches(files, batch_size) :
+                db = data_read.DataRead(path, workers=workers, files=batch, cache_dir=cache_dir, metrics=self.metrics)
+                offset = self.write_tables(db, commit=True)
+                self.write_manifest(path, db, offset)
+                self.connection.commit()
+                del db # let the batch go before the next one is read
+            self.refresh_summaries()
+            self.connection.commit()
+            with metrics.timed(self.metrics, "indexes") :
+                start = time.perf_counter()
+                for ddl in INDEXES :
+                    cursor.execute(ddl)
+                self.connection.commit()
+                self.load_timings["indexes"] = time.perf_counter() - start
+            sample["files"] = len(files)
+        cursor.close()
+        self.results.clear()
+
+    def update_db(self, path: str, workers: int = None, batch_size: int = None, cache_dir: str = None, **filters) :
+        """
+        Brings an existing database up to date with the JSON data in the provided path,
+        parsing only the files that are new or have changed since they were last loaded.
+        Matches whose files have been removed are deleted, and the player table is reloaded if
+        people.csv has changed. If the database has no manifest, or was built before players were
+        given integer ids, it is created from scratch instead.
+
+        Only the summary rows of players (and batter and bowler pairs) who appear in a deleted
+        or newly loaded match are recomputed; the rest are left as they are.
+
+        Arguments:
+            path: the path from which to retrieve JSON data
+            workers: the number of processes used to parse the JSON data
+            batch_size: the number of files to read at a time, as in create_db()
+            cache_dir: a directory in which to cache parsed scorecards between builds
+            filters: filters on the matches to keep, as in create_db(). Matches that no longer
+                pass are deleted, as if their files had been removed
+        Returns:
+            changed: the scorecard files that were (re)loaded
+        """
+        files = scorecard_files(path, filters)
+        cursor = self.connection.cursor()
+        has_manifest = cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='manifest'").fetchone() is not None
+        # Databases from before players were given integer ids store identifiers in the match tables
+        has_player_ids = "player_id" in [row[1] for row in cursor.execute("PRAGMA table_info(player)")]
+        if not has_manifest or not has_player_ids :
+            cursor.close()
+            self.create_db(path, workers=workers, batch_size=batch_size, cache_dir=cache_dir, **filters)
+            return files
+        manifest = {row[0]: row[1:] for row in
+                    cursor.execute("SELECT path, size, mtime, hash, match_id FROM manifest")}
+
+        changed = []
+        unchanged_mtimes = []
+        on_disk = set()
+        # people.csv is tracked like a scorecard, since CricSheet updates it on its own
+        people = os.path.join(path, PEOPLE_FILE)
+        for filename in files + [people] :
+            name = os.path.relpath(filename, path)
+            on_disk.add(name)
+            stat = os.stat(filename)
+            if name not in manifest :
+                changed.append(filename)
+                continue
+            size, mtime, digest = manifest[name][:3]
+            if size == stat.st_size and mtime == stat.st_mtime :
+                continue
+            # Touched files only need reloading if their contents actually changed
+            if size == stat.st_size and digest == data_read.file_hash(filename) :
+                unchanged_mtimes.append((stat.st_mtime, name))
+            else :
+                changed.append(filename)
+        players_changed = people in changed
+        if players_changed :
+            changed.remove(people)
+
+        stale = [name for name in manifest if name not in on_disk]
+        stale += [os.path.relpath(filename, path) for filename in changed
+                  if os.path.relpath(filename, path) in manifest]
+        stale_ids = [manifest[name][3] for name in stale]
+
+        self.load_timings = {}
+        # Unlike a fresh build, the update is applied as a single transaction with the journal kept
+        # on disk, so that a failure (or a crash) leaves the database as it was
+        with metrics.timed(self.metrics, "update_db") as sample, self.bulk_load(UPDATE_PRAGMAS), self.connection :
+            sample["files"] = len(changed)
+            cursor.executemany("UPDATE manifest SET mtime = ? WHERE path = ?", unchanged_mtimes)
+            cursor.executemany("DELETE FROM manifest WHERE path = ?", [(name,) for name in stale])
+            # Databases built before the summary tables existed get them built in full
+            missing = [name for name in SUMMARIES if cursor.execute(
+                "SELECT name FROM sqlite_master WHERE type='table' AND name=?", (name,)).fetchone() is None]
+            for name in missing :
+                cursor.execute(SCHEMA[name])
+            self.summary_keys(stale_ids)
+            self.delete_matches(stale_ids)
+            first_new = cursor.execute("SELECT COALESCE(MAX(match_id) + 1, 0) FROM match").fetchone()[0]
+            if players_changed :
+                self.write_players(path)
+            for batch in file_batches(changed, batch_size) :
+                db = data_read.DataRead(path, workers=workers, files=batch, cache_dir=cache_dir, metrics=self.metrics)
+                offset = self.write_tables(db)
+                self.write_manifest(path, db, offset)
+                del db
+            new_ids = [row[0] for row in cursor.execute("SELECT match_id FROM match WHERE match_id >= ?", (first_new,))]
+            self.summary_keys(new_ids)
+            self.refresh_summaries(incremental=len(missing) == 0)
+            cursor.execute("DROP TABLE temp.summary_players")
+            cursor.execute("DROP TABLE temp.summary_pairs")
+        cursor.close()
+        self.results.clear()
+        return changed
+
+    def delete_matches(self, match_ids) :
+        """
+        Deletes every row belonging to the given matches from the match tables.
+
+        Arguments:
+            match_ids: the ids of the matches to delete
+        """
+        cursor = self.connection.cursor()
+        for table in MATCH_TABLES :
+            cursor.executemany(f"DELETE FROM {table} WHERE match_id = ?", [(match_id,) for match_id in match_ids])
+        cursor.close()
+
+    def summary_keys(self, match_ids) :
+        """
+        Adds the players, and batter and bowler pairs, who appear in the given matches to the
+        temporary tables of keys whose summary rows need recomputing.
+
+        Arguments:
+            match_ids: the ids of the matches
+        """
+        cursor = self.connection.cursor()
+        cursor.execute("CREATE TEMP TABLE IF NOT EXISTS summary_players (player_id INTEGER PRIMARY KEY)")
+        cursor.execute("CREATE TEMP TABLE IF NOT EXISTS summary_pairs (batter INTEGER, bowler INTEGER, PRIMARY KEY (batter, bowler))")
+        rows = [(match_id,) for match_id in match_ids]
+        cursor.executemany("INSERT OR IGNORE INTO temp.summary_players SELECT player_id FROM player_match WHERE match_id = ?", rows)
+        cursor.executemany("INSERT OR IGNORE INTO temp.summary_pairs SELECT batter, bowler FROM delivery WHERE match_id = ?", rows)
+        cursor.close()
+
+    def refresh_summaries(self, incremental: bool = False) :
+        """
+        Rebuilds the summary tables from the match tables, recording the time taken in
+        load_timings. Summary rows are sums over matches, so a player's rows only change
+        when one of their matches is added or removed.
+
+        Arguments:
+            incremental: whether to recompute only the keys collected by summary_keys(),
+                rather than every row
         """
+        start = time.perf_counter()
         cursor = self.connection.cursor()
-        db = data_read.DataRead(path)
-
-        # to_sql doesn't allow you to specify keys; this shouldn't matter for normal
-        # database operations but may try to implement primary/foreign keys for 
-        # completion's sake
-        db.match.to_sql("match", self.connection, if_exists='replace')
-        db.player.to_sql("player", self.connection, if_exists='replace')
-        db.player_match.to_sql("player_match", self.connection, if_exists='replace')
-        db.delivery.to_sql("delivery", self.connection, if_exists='replace')
-        db.wickets.to_sql("wickets", self.connection, if_exists='replace')
-        db.extras.to_sql("extras", self.connection, if_exists='replace')
-        db.fielder_wickets.to_sql("fielder_wickets", self.connection, if_exists='replace')
+        for name, (base, query) in SUMMARIES.items() :
+            key_table, keys, full_source, key_source = SUMMARY_SOURCES[base]
+            with metrics.timed(self.metrics, f"summary_{name}") :
+                if incremental :
+                    matches = " AND ".join(f"{name}.{key} = k.{key}" for key in keys)
+                    cursor.execute(f"DELETE FROM {name} WHERE EXISTS (SELECT 1 FROM {key_table} k WHERE {matches})")
+                    cursor.execute(f"INSERT INTO {name} " + query.format(source=key_source))
+                else :
+                    cursor.execute(f"DELETE FROM {name}")
+                    cursor.execute(f"INSERT INTO {name} " + query.format(source=full_source))
         cursor.close()
+        self.load_timings["summaries"] = time.perf_counter() - start
+
+    @contextmanager
+    def bulk_load(self, pragmas: dict = LOAD_PRAGMAS) :
+        """
+        Applies LOAD_PRAGMAS (or other pragmas) for the duration of a with block, restoring the
+        previous settings afterwards. Must be entered outside of a transaction.
+
+        Arguments:
+            pragmas: the pragmas to apply, mapped to their values
+        """
+        previous = {pragma: self.connection.execute(f"PRAGMA {pragma}").fetchone()[0] for pragma in pragmas}
+        if previous.get("journal_mode") == "wal" :
+            # Leaving WAL mode would lock out the query methods' readers, so it's kept
+            del previous["journal_mode"]
+        for pragma in previous :
+            self.connection.execute(f"PRAGMA {pragma} = {pragmas[pragma]}")
+        try :
+            yield
+        finally :
+            if self.connection.in_transaction :
+                self.connection.rollback()
+            for pragma, value in previous.items() :
+                self.connection.execute(f"PRAGMA {pragma} = {value}")
+
+    def insert_rows(self, name: str, table, commit: bool = False) :
+        """
+        Inserts every row of a DataFrame into a table with a single executemany(), recording
+        the time taken in load_timings.
+
+        Arguments:
+            name: the table to insert into
+            table: the DataFrame to insert, with columns named as in the table
+            commit: whether to commit once the rows are inserted
+        """
+        start = time.perf_counter()
+        with metrics.timed(self.metrics, f"write_{name}") as sample :
+            columns = ", ".join(f'"{column}"' for column in table.columns)
+            placeholders = ", ".join(["?"] * len(table.columns))
+            self.connection.executemany(f"INSERT INTO {name} ({columns}) VALUES ({placeholders})", sql_rows(table))
+            if commit :
+                self.connection.commit()
+            sample["rows"] = len(table)
+        self.load_timings[name] = self.load_timings.get(name, 0) + time.perf_counter() - start
+
+    def write_tables(self, db, commit: bool = False) :
+        """
+        Adds the match tables of a DataRead object to the database. The object's match ids are
+        shifted past those already in the database, team names and registry identifiers are
+        swapped for ids from the team and player tables (adding any new teams and players to
+        them), and season and match_number are only kept in the match table, since every other
+        table refers to it by match_id.
+
+        Arguments:
+            db: the DataRead object to write
+            commit: whether to commit after each table, rather than leaving it to the caller
+        Returns:
+            offset: the amount added to the object's match ids
+        """
+        cursor = self.connection.cursor()
+        offset = cursor.execute("SELECT COALESCE(MAX(match_id) + 1, 0) FROM match").fetchone()[0]
+        team_ids = dict(cursor.execute("SELECT name, team_id FROM team"))
+        names = pd.concat([db.match["batting_first"], db.match["chasing"], db.player_match["team"]]).dropna().unique()
+        next_id = max(team_ids.values(), default=-1) + 1
+        new_teams = [(next_id + i, name) for i, name in enumerate(name for name in names if name not in team_ids)]
+        cursor.executemany("INSERT INTO team (team_id, name) VALUES (?, ?)", new_teams)
+        team_ids.update((name, team_id) for team_id, name in new_teams)
+        # Likewise for players, though any missing from people.csv only get their identifier
+        player_ids = self.player_ids()
+        identifiers = set()
+        for name, columns in PLAYER_COLUMNS.items() :
+            for column in columns :
+                identifiers.update(getattr(db, name)[column].dropna().unique())
+        next_id = max(player_ids.values(), default=-1) + 1
+        new_players = [(next_id + i, identifier) for i, identifier in enumerate(sorted(identifiers - player_ids.keys()))]
+        cursor.executemany("INSERT INTO player (player_id, identifier) VALUES (?, ?)", new_players)
+        player_ids.update((identifier, player_id) for player_id, identifier in new_players)
+
+        tables = {"match": db.match, "player_match": db.player_match, "delivery": db.delivery,
+                  "wickets": db.wickets, "extras": db.extras, "fielder_wickets": db.fielder_wickets}
+        for name, table in tables.items() :
+            table = table if name == "match" else table.drop(["season", "match_number"], axis=1)
+            table = table.assign(match_id=table["match_id"].astype("int64") + offset)
+            for column in TEAM_COLUMNS[name] :
+                table[column] = table[column].astype(object).map(team_ids).astype("Int64")
+            for column in PLAYER_COLUMNS[name] :
+                table[column] = table[column].map(player_ids).astype("Int64")
+            self.insert_rows(name, table, commit)
+        cursor.close()
+        return offset
+
+    def write_players(self, path: str, commit: bool = False) :
+        """
+        Replaces the player table with the contents of people.csv, recording the file in the
+        manifest so that update_db() only reloads it once it changes. Players keep the
+        player_id they already had, so the match tables don't need rewriting; players who've
+        dropped out of people.csv keep their row (with just their identifier), since matches
+        may still refer to them.
+
+        Arguments:
+            path: the path the JSON data is retrieved from, which holds people.csv
+            commit: whether to commit once the players are written
+        """
+        filename = os.path.join(path, PEOPLE_FILE)
+        stat = os.stat(filename)
+        people = pd.read_csv(filename)
+        known = self.player_ids()
+        next_id = max(known.values(), default=-1) + 1
+        new_players = [identifier for identifier in people["identifier"].unique() if identifier not in known]
+        ids = dict(known)
+        ids.update((identifier, next_id + i) for i, identifier in enumerate(new_players))
+        people.insert(0, "player_id", people["identifier"].map(ids))
+        listed = set(people["identifier"])
+        unlisted = [(player_id, identifier) for identifier, player_id in known.items() if identifier not in listed]
+        # Recreated rather than emptied, in case CricSheet has added columns since
+        self.connection.execute("DROP TABLE IF EXISTS player")
+        self.connection.execute(player_schema(people.columns))
+        self.connection.execute("INSERT OR REPLACE INTO manifest VALUES (?, ?, ?, ?, NULL)",
+                                (PEOPLE_FILE, stat.st_size, stat.st_mtime, data_read.file_hash(filename)))
+        self.connection.executemany("INSERT INTO player (player_id, identifier) VALUES (?, ?)", unlisted)
+        self.insert_rows("player", people, commit)
+
+    def player_ids(self) :
+        """Returns a dict mapping the registry identifier of every player in the player table to their player_id."""
+        if self.connection.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='player'").fetchone() is None :
+            return {}
+        return dict(self.connection.execute("SELECT identifier, player_id FROM player"))
+
+    def write_manifest(self, path: str, db, offset: int) :
+        """
+        Records the size, modification time, content hash and match id of each file read
+        by a DataRead object in the manifest table.
+
+        Arguments:
+            path: the path the JSON data was retrieved from
+            db: the DataRead object the files were loaded with
+            offset: the amount write_tables() added to the object's match ids
+        """
+        rows = []
+        # DataRead hands out match ids in file order
+        for match_id, filename in enumerate(db.scorecard_files(), start=offset) :
+            stat = os.stat(filename)
+            rows.append((os.path.relpath(filename, path), stat.st_size, stat.st_mtime,
+                         data_read.file_hash(filename), match_id))
+        self.connection.executemany("INSERT OR REPLACE INTO manifest VALUES (?, ?, ?, ?, ?)", rows)
+
+    def query(self, name: str, params: tuple) -> pd.DataFrame :
+        """
+        Runs one of the statements in QUERIES on a pooled read-only connection. Results are
+        cached by statement and parameters until the database is next changed, whether by
+        create_db(), update_db() or any other connection.
+
+        Arguments:
+            name: the name of the statement in QUERIES
+            params: the values bound to the statement's parameters
+        Returns:
+            a copy of the result, so callers may modify it freely
+        """
+        return self.cached_query((name, params), QUERIES[name], params)
+
+    def cached_query(self, key, statement: str, params: tuple) -> pd.DataFrame :
+        if self.pool is None :
+            with self.pool_lock :
+                if self.pool is None :
+                    # WAL lets the readers carry on while the database is being written to. It's
+                    # switched on from a connection of its own, since the writer can only be
+                    # used by the thread that created this object
+                    with closing(sqlite3.connect(self.dbpath)) as connection :
+                        connection.execute("PRAGMA journal_mode = WAL")
+                    self.pool = ReadPool(self.dbpath, self.pool_size)
+        with self.pool.connection() as connection :
+            # data_version changes whenever another connection, from this process or any other,
+            # commits to the database, so any change means the cached results may be out of date.
+            # A connection that hasn't checked before can't tell, so it clears them too
+            version = connection.execute("PRAGMA data_version").fetchone()[0]
+            if self.data_versions.get(connection) != version :
+                self.data_versions[connection] = version
+                self.results.clear()
+            generation = self.results.generation
+            result = self.results.get(key)
+            if result is None :
+                result = pd.read_sql(statement, connection, params=params)
+                self.results.put(key, result, generation)
+        return result.copy()
+
+    def player_scorecard(self, player_id: str, season: str = None) -> pd.DataFrame :
+        """
+        Gets a player's figures in each of their matches, in the order the matches were loaded.
+
+        Arguments:
+            player_id: the player's CricSheet registry identifier
+            season: a season to limit the matches to
+        Returns:
+            a DataFrame with a row for each match
+        """
+        if season is None :
+            return self.query("player_scorecard", (player_id,))
+        return self.query("player_season_scorecard", (player_id, str(season)))
+
+    def match_deliveries(self, match_id: int) -> pd.DataFrame :
+        """
+        Gets every delivery of a match in the order they were bowled, with team names in place
+        of team ids.
+
+        Arguments:
+            match_id: the id of the match
+        Returns:
+            a DataFrame with a row for each delivery
+        """
+        return self.query("match_deliveries", (int(match_id),))
+
+    def head_to_head(self, batter: str = None, bowler: str = None) -> pd.DataFrame :
+        """
+        Gets a batter's record against a bowler from the head_to_head table. If only one of
+        them is given, their record against every opponent is returned, most balls first.
+
+        Arguments:
+            batter: the batter's CricSheet registry identifier
+            bowler: the bowler's CricSheet registry identifier
+        Returns:
+            a DataFrame of head_to_head rows
+        """
+        if batter is not None and bowler is not None :
+            return self.query("head_to_head", (batter, bowler))
+        if batter is not None :
+            return self.query("batter_head_to_head", (batter,))
+        if bowler is not None :
+            return self.query("bowler_head_to_head", (bowler,))
+        raise ValueError("head_to_head() needs a batter, a bowler or both")
+
+    def season_leaders(self, season: str, stat: str = "runs_scored", limit: int = 10, ascending: bool = False) -> pd.DataFrame :
+        """
+        Ranks the players of a season by one of the player_season figures.
+
+        Arguments:
+            season: the season to rank
+            stat: the column of player_season to rank by, one of LEADER_STATS
+            limit: the number of players to return
+            ascending: whether lower figures rank higher, as for economy
+        Returns:
+            a DataFrame of player_season rows, best first, with each player's name
+        """
+        if stat not in LEADER_STATS :
+            raise ValueError(f"can't rank players by {stat!r}; expected one of {LEADER_STATS}")
+        # Column names can't be bound as parameters, but stat has been checked against LEADER_STATS
+        order = "ASC" if ascending else "DESC"
+        columns = ", ".join(f"ps.{column}" for column in LEADER_STATS)
+        statement = f"""SELECT (SELECT name FROM player_match WHERE player_id = ps.player_id LIMIT 1) AS name,
+            p.identifier AS player_id, ps.season, {columns}
+            FROM player_season ps JOIN player p ON p.player_id = ps.player_id
+            WHERE ps.season = ? AND ps.{stat} IS NOT NULL
+            ORDER BY ps.{stat} {order}, p.identifier LIMIT ?"""
+        return self.cached_query(("season_leaders", stat, order, str(season), int(limit)), statement, (str(season), int(limit)))
 
     def get_cursor(self) :
         return self.connection.cursor()
 
     def close(self) :
-        self.connection.close()
\ No newline at end of file
+        if self.pool is not None :
+            self.pool.close()
+        self.connection.close()
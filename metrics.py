@@ -0,0 +1,170 @@
+import cProfile
+import json
+import pstats
+import time
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+
+class Metrics :
+    """
+    Collects measurements of each stage of a build, for passing to DataRead or CricDB. Every
+    stage records its wall time and any counts it reports, such as rows, files and bytes read;
+    stages that run more than once, like the reads of a batched build, are added up. Memory
+    tracing and profiling are off unless asked for, since both slow the build down.
+    """
+
+    def __init__ (self, trace_memory: bool = False, profile: bool = False, callbacks: list = None,
+                  profile_entries: int = 20) :
+        """
+        Arguments:
+            trace_memory: whether to record the peak memory allocated by each stage with tracemalloc
+            profile: whether to profile each stage with cProfile
+            callbacks: functions called with the name of a stage and its measurements (a dict)
+                each time the stage finishes
+            profile_entries: the number of functions kept from each stage's profile, by cumulative time
+        """
+        self.trace_memory = trace_memory
+        self.profile = profile
+        self.callbacks = callbacks if callbacks is not None else []
+        self.profile_entries = profile_entries
+        self.stages = {}
+        # The stages currently running, innermost last
+        self.active = []
+        self.started_tracing = False
+
+    @contextmanager
+    def stage(self, name: str, frames = None) :
+        """
+        Measures a with block as a run of a stage. The block is given a dict to add counts to,
+        such as {"rows": 100}, which are added to the stage's totals.
+
+        Arguments:
+            name: the name of the stage
+            frames: a function returning a dict of DataFrames, whose memory is recorded once the
+                block has finished (outside the timed part)
+        """
+        sample = {}
+        run = {"sample": sample, "profiler": None, "peak": 0}
+        if self.trace_memory :
+            if not tracemalloc.is_tracing() :
+                tracemalloc.start()
+                self.started_tracing = True
+            self.update_peaks()
+            tracemalloc.reset_peak()
+            run["baseline"] = tracemalloc.get_traced_memory()[0]
+        if self.profile :
+            # Only one profiler can run at once, so the enclosing stage's is paused
+            if len(self.active) > 0 and self.active[-1]["profiler"] is not None :
+                self.active[-1]["profiler"].disable()
+            run["profiler"] = cProfile.Profile()
+            run["profiler"].enable()
+        self.active.append(run)
+        start = time.perf_counter()
+        try :
+            yield sample
+        finally :
+            sample["seconds"] = time.perf_counter() - start
+            self.active.pop()
+            if run["profiler"] is not None :
+                run["profiler"].disable()
+                if len(self.active) > 0 and self.active[-1]["profiler"] is not None :
+                    self.active[-1]["profiler"].enable()
+            if self.trace_memory :
+                peak = tracemalloc.get_traced_memory()[1]
+                for outer in self.active :
+                    outer["peak"] = max(outer["peak"], peak)
+                sample["peak_bytes"] = max(run["peak"], peak) - run["baseline"]
+                if len(self.active) == 0 and self.started_tracing :
+                    tracemalloc.stop()
+                    self.started_tracing = False
+            if frames is not None :
+                sample["frame_bytes"] = {table: int(frame.memory_usage(index=True, deep=True).sum())
+                                         for table, frame in frames().items()}
+            self.add(name, sample, run["profiler"])
+
+    def update_peaks(self) :
+        # Carries the peak so far over to the running stages, before it's reset for a new one
+        peak = tracemalloc.get_traced_memory()[1]
+        for run in self.active :
+            run["peak"] = max(run["peak"], peak)
+
+    def add(self, name: str, sample: dict, profiler = None) :
+        """
+        Adds a run of a stage to its totals and passes it on to the callbacks.
+
+        Arguments:
+            name: the name of the stage
+            sample: the run's measurements
+            profiler: the run's cProfile.Profile, if it was profiled
+        """
+        totals = self.stages.setdefault(name, {"runs": 0, "seconds": 0.0})
+        totals["runs"] += 1
+        for key, value in sample.items() :
+            if key == "frame_bytes" :
+                totals[key] = value # the memory held after the latest run
+            elif key == "peak_bytes" :
+                totals[key] = max(totals.get(key, 0), value)
+            else :
+                totals[key] = totals.get(key, 0) + value
+        if profiler is not None :
+            if "profiler" in totals :
+                totals["profiler"].add(profiler)
+            else :
+                totals["profiler"] = pstats.Stats(profiler)
+        for callback in self.callbacks :
+            callback(name, sample)
+
+    def profile_summary(self, stats) :
+        """Returns the functions taking the most cumulative time in a pstats.Stats, as JSON-ready dicts."""
+        rows = []
+        for (filename, line, function), (_, calls, total, cumulative, _) in stats.stats.items() :
+            rows.append({"function": f"{filename}:{line}({function})", "calls": calls,
+                         "total_seconds": total, "cumulative_seconds": cumulative})
+        rows.sort(key=lambda row: row["cumulative_seconds"], reverse=True)
+        return rows[:self.profile_entries]
+
+    def to_dict(self) :
+        """
+        Returns the totals of every stage, in the order the stages first ran. Rates are added
+        for any rows, files and bytes counted.
+        """
+        report = {}
+        for name, totals in self.stages.items() :
+            stage = {key: value for key, value in totals.items() if key != "profiler"}
+            for count in ("rows", "files", "bytes") :
+                if count in stage and stage["seconds"] > 0 :
+                    stage[f"{count}_per_second"] = stage[count] / stage["seconds"]
+            if "profiler" in totals :
+                # Each profile holds a stage's own time; time in nested stages is profiled under them
+                stage["profile"] = self.profile_summary(totals["profiler"])
+            report[name] = stage
+        return report
+
+    def to_json(self, path: str = None) :
+        """
+        Exports the totals of every stage as JSON.
+
+        Arguments:
+            path: a file to write the JSON to
+        Returns:
+            the JSON, as a string
+        """
+        text = json.dumps(self.to_dict(), indent=2)
+        if path is not None :
+            with open(path, 'w') as f :
+                f.write(text)
+        return text
+
+def timed(metrics, name: str, frames = None) :
+    """
+    Measures a with block as a stage of metrics, or does nothing if metrics is None. Either
+    way, the block is given a dict to add counts to.
+
+    Arguments:
+        metrics: a Metrics object, or None
+        name: the name of the stage
+        frames: as in Metrics.stage()
+    """
+    if metrics is None :
+        return nullcontext({})
+    return metrics.stage(name, frames)
@@ -0,0 +1,278 @@
+import csv
+import json
+import os
+import random
+import sys
+
+# Synthetic CricSheet data, for benchmarking and testing without the real archive. The files
+# follow the CricSheet JSON format (see https://cricsheet.org/format/json/) closely enough for
+# DataRead, and the numbers are loosely modelled on IPL matches.
+
+FIRST_NAMES = ["A", "B", "C", "D", "E", "F", "G", "H", "J", "K", "L", "M", "N", "P", "R", "S", "T", "V", "W", "Y"]
+LAST_NAMES = ["Sharma", "Kumar", "Singh", "Patel", "Khan", "Iyer", "Rao", "Yadav", "Pandya", "Gill", "Jadeja",
+              "Rahane", "Pant", "Samson", "Chahal", "Bumrah", "Smith", "Warner", "Russell", "Narine", "Buttler",
+              "Stokes", "Rashid", "Boult", "Maxwell", "Finch", "Pollard", "Gayle", "Miller", "Rabada"]
+TEAM_NAMES = ["Chennai Super Kings", "Mumbai Indians", "Royal Challengers Bangalore", "Kolkata Knight Riders",
+              "Rajasthan Royals", "Delhi Capitals", "Punjab Kings", "Sunrisers Hyderabad", "Gujarat Titans",
+              "Lucknow Super Giants", "Deccan Chargers", "Pune Warriors", "Kochi Tuskers Kerala", "Gujarat Lions"]
+CITIES = ["Chennai", "Mumbai", "Bangalore", "Kolkata", "Jaipur", "Delhi", "Mohali", "Hyderabad", "Ahmedabad",
+          "Lucknow", "Pune", "Dubai", "Abu Dhabi", "Sharjah"]
+PLAYOFF_STAGES = ["Qualifier 1", "Eliminator", "Qualifier 2", "Final"]
+# Runs off the bat on a legal delivery, and how often each is scored
+BATTER_RUNS = [0, 1, 2, 3, 4, 6]
+BATTER_RUNS_WEIGHTS = [35, 37, 8, 0.5, 13, 6.5]
+# Dismissals and how often each happens
+WICKET_KINDS = ["caught", "bowled", "lbw", "run out", "stumped", "caught and bowled"]
+WICKET_KINDS_WEIGHTS = [60, 17, 9, 8, 3, 3]
+SQUAD_SIZE = 20
+WICKET_RATE = 0.05
+
+def generate(path: str, matches: int, seed: int = 0, teams: int = 8, matches_per_season: int = 60) :
+    """
+    Writes synthetic CricSheet scorecards and a matching people.csv to a directory. Files are
+    written one at a time, so any number of matches can be generated in constant memory.
+
+    Arguments:
+        path: the directory to write to, created if it doesn't exist
+        matches: the number of scorecards to write
+        seed: the seed for the random number generator; the same seed gives the same files
+        teams: the number of teams, at most len(TEAM_NAMES)
+        matches_per_season: the number of matches in each season, the last four of which are playoffs
+    """
+    rng = random.Random(seed)
+    os.makedirs(path, exist_ok=True)
+    team_names = TEAM_NAMES[:teams]
+    people = {}
+    identifiers = set()
+    squads = {team: [new_person(rng, people, identifiers) for _ in range(SQUAD_SIZE)] for team in team_names}
+    umpires = [new_person(rng, people, identifiers) for _ in range(12)]
+
+    for index in range(matches) :
+        season_index, number = divmod(index, matches_per_season)
+        if number == 0 and season_index > 0 :
+            transfer_window(rng, squads, people, identifiers)
+        year = 2008 + season_index
+        # CricSheet gives most seasons as numbers, but seasons played across two years as strings
+        season = f"{year - 1}/{year % 100:02d}" if season_index % 4 == 3 else year
+        if number >= matches_per_season - len(PLAYOFF_STAGES) :
+            event = {"name": "Indian Premier League", "stage": PLAYOFF_STAGES[number - matches_per_season]}
+        else :
+            event = {"name": "Indian Premier League", "match_number": number + 1}
+        scorecard = match_scorecard(rng, season, year, event, squads, umpires, people)
+        with open(os.path.join(path, f"{1000000 + index}.json"), 'w') as f :
+            json.dump(scorecard, f)
+
+    with open(os.path.join(path, "people.csv"), 'w', newline='') as f :
+        writer = csv.writer(f)
+        writer.writerow(["identifier", "name", "unique_name"])
+        for name, identifier in people.items() :
+            writer.writerow([identifier, name, name])
+
+def new_person(rng, people, identifiers) :
+    """
+    Makes up a person with a unique name and registry identifier, adding them to people.
+
+    Arguments:
+        rng: the random number generator
+        people: a dict mapping each person's name to their identifier
+        identifiers: the identifiers handed out so far, which the new one is added to
+    Returns:
+        the new person's name
+    """
+    name = f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+    if name in people :
+        name = f"{name} {len(people)}"
+    # 32 random bits collide often enough over an archive's worth of people to need checking
+    identifier = f"{rng.getrandbits(32):08x}"
+    while identifier in identifiers :
+        identifier = f"{rng.getrandbits(32):08x}"
+    identifiers.add(identifier)
+    people[name] = identifier
+    return name
+
+def transfer_window(rng, squads, people, identifiers) :
+    """Moves a few players between teams and replaces a few with newcomers, as between seasons."""
+    team_names = list(squads)
+    for team in team_names :
+        for _ in range(2) :
+            squad = squads[team]
+            squad.pop(rng.randrange(len(squad)))
+            squad.append(new_person(rng, people, identifiers))
+        other = rng.choice(team_names)
+        if other != team :
+            i, j = rng.randrange(SQUAD_SIZE), rng.randrange(SQUAD_SIZE)
+            squads[team][i], squads[other][j] = squads[other][j], squads[team][i]
+
+def match_scorecard(rng, season, year: int, event: dict, squads: dict, umpires: list, people: dict) :
+    """
+    Simulates a match between two random teams, returning its scorecard.
+
+    Arguments:
+        rng: the random number generator
+        season: the season, as written in the scorecard
+        year: the year the match is played in
+        event: the event field of the scorecard
+        squads: a dict mapping each team to its players
+        umpires: the umpires who may stand in the match
+        people: a dict mapping each person's name to their identifier
+    Returns:
+        the scorecard, as a JSON-ready dict
+    """
+    home, away = rng.sample(list(squads), 2)
+    xi = {home: rng.sample(squads[home], 11), away: rng.sample(squads[away], 11)}
+    toss_winner = rng.choice([home, away])
+    decision = rng.choice(["bat", "field"])
+    batting_first = toss_winner if decision == "bat" else (away if toss_winner == home else home)
+    chasing = away if batting_first == home else home
+    officials = rng.sample(umpires, 3)
+    info = {
+        "balls_per_over": 6,
+        "city": CITIES[TEAM_NAMES.index(home) % len(CITIES)],
+        "dates": [f"{year}-{rng.randint(3, 5):02d}-{rng.randint(1, 28):02d}"],
+        "event": event,
+        "gender": "male",
+        "match_type": "T20",
+        "officials": {"umpires": officials[:2], "match_referees": officials[2:]},
+        "outcome": {},
+        "overs": 20,
+        "players": xi,
+        "registry": {"people": {name: people[name] for name in xi[home] + xi[away] + officials}},
+        "season": season,
+        "team_type": "club",
+        "teams": [home, away],
+        "toss": {"decision": decision, "winner": toss_winner},
+        "venue": f"{CITIES[TEAM_NAMES.index(home) % len(CITIES)]} Stadium",
+    }
+    if rng.random() < 0.03 :
+        del info["city"] # a few real scorecards have no city, only a venue
+
+    first, first_runs, _ = innings_scorecard(rng, batting_first, xi[batting_first], xi[chasing], 20)
+    innings = [first]
+    if rng.random() < 0.01 :
+        # Rained off after the first innings
+        info["outcome"] = {"result": "no result"}
+        return {"meta": {"data_version": "1.1.0", "revision": 1}, "info": info, "innings": innings}
+
+    # A few matches are shortened by rain, with a revised target for the chase
+    overs = rng.randint(5, 19) if rng.random() < 0.03 else 20
+    target = first_runs + 1 if overs == 20 else round((first_runs + 1) * overs / 20)
+    second, second_runs, second_wickets = innings_scorecard(rng, chasing, xi[chasing], xi[batting_first], overs, target)
+    second["target"] = {"overs": overs, "runs": target}
+    innings.append(second)
+    if overs < 20 :
+        info["outcome"]["method"] = "D/L"
+
+    if second_runs >= target :
+        info["outcome"].update({"winner": chasing, "by": {"wickets": 10 - second_wickets}})
+    elif second_runs < target - 1 :
+        info["outcome"].update({"winner": batting_first, "by": {"runs": target - 1 - second_runs}})
+    else :
+        # A tie, settled by a super over in which the chasing team bats first
+        super_first, super_first_runs, _ = innings_scorecard(rng, chasing, xi[chasing], xi[batting_first], 1, wickets=2)
+        super_second, super_second_runs, _ = innings_scorecard(rng, batting_first, xi[batting_first], xi[chasing], 1,
+                                                               super_first_runs + 1, wickets=2)
+        for super_over in (super_first, super_second) :
+            super_over["super_over"] = True
+        innings += [super_first, super_second]
+        eliminator = batting_first if super_second_runs > super_first_runs else chasing
+        info["outcome"] = {"result": "tie", "eliminator": eliminator}
+    winner = info["outcome"].get("winner", info["outcome"].get("eliminator"))
+    info["player_of_match"] = [rng.choice(xi[winner])]
+    return {"meta": {"data_version": "1.1.0", "revision": 1}, "info": info, "innings": innings}
+
+def innings_scorecard(rng, team: str, batters: list, fielders: list, overs: int, target: int = None, wickets: int = 10) :
+    """
+    Simulates an innings, ball by ball.
+
+    Arguments:
+        rng: the random number generator
+        team: the batting team
+        batters: the batting team's players, in batting order
+        fielders: the fielding team's players; the last five bowl and the sixth from last keeps wicket
+        overs: the number of overs in the innings
+        target: the runs needed to win, if the innings is a chase
+        wickets: the number of wickets that end the innings
+    Returns:
+        innings: the innings, as a JSON-ready dict
+        runs: the runs scored
+        fallen: the wickets fallen
+    """
+    bowlers = fielders[-5:]
+    keeper = fielders[-6]
+    max_overs = -(-overs // len(bowlers))
+    bowled = {bowler: 0 for bowler in bowlers}
+    striker, non_striker, next_in = batters[0], batters[1], 2
+    runs, fallen = 0, 0
+    over_list = []
+    previous = None
+    for over in range(overs) :
+        # No bowler bowls consecutive overs or more than their share of the innings
+        choices = [bowler for bowler in bowlers if bowler != previous and bowled[bowler] < max_overs]
+        bowler = rng.choice(choices or [bowler for bowler in bowlers if bowler != previous])
+        bowled[bowler] += 1
+        previous = bowler
+        deliveries = []
+        legal = 0
+        while legal < 6 :
+            delivery = {"batter": striker, "bowler": bowler, "non_striker": non_striker}
+            batter_runs, extras = 0, {}
+            roll = rng.random()
+            if roll < 0.035 :
+                extras["wides"] = 5 if rng.random() < 0.03 else 1
+            elif roll < 0.04 :
+                extras["noballs"] = 1
+                batter_runs = rng.choices(BATTER_RUNS, BATTER_RUNS_WEIGHTS)[0]
+            elif roll < 0.06 :
+                extras["legbyes"] = rng.choice([1, 1, 1, 2, 4])
+            elif roll < 0.065 :
+                extras["byes"] = rng.choice([1, 1, 4])
+            else :
+                batter_runs = rng.choices(BATTER_RUNS, BATTER_RUNS_WEIGHTS)[0]
+            if rng.random() < 0.0005 :
+                extras["penalty"] = 5
+            extra_runs = sum(extras.values())
+            delivery["runs"] = {"batter": batter_runs, "extras": extra_runs, "total": batter_runs + extra_runs}
+            if extras :
+                delivery["extras"] = extras
+            if "wides" not in extras and "noballs" not in extras :
+                legal += 1
+
+            out = None
+            if "noballs" not in extras and rng.random() < WICKET_RATE :
+                kind = rng.choices(WICKET_KINDS, WICKET_KINDS_WEIGHTS)[0]
+                if "wides" in extras and kind not in ("stumped", "run out") :
+                    kind = "stumped"
+                out = non_striker if kind == "run out" and rng.random() < 0.3 else striker
+                wicket = {"player_out": out, "kind": kind}
+                if kind in ("caught", "run out") :
+                    count = 2 if kind == "run out" and rng.random() < 0.3 else 1
+                    wicket["fielders"] = [{"name": name} for name in rng.sample([f for f in fielders if f != bowler], count)]
+                elif kind == "stumped" :
+                    wicket["fielders"] = [{"name": keeper}]
+                elif kind == "caught and bowled" :
+                    wicket["fielders"] = [{"name": bowler}]
+                delivery["wickets"] = [wicket]
+            deliveries.append(delivery)
+            runs += batter_runs + extra_runs
+
+            if batter_runs % 2 == 1 :
+                striker, non_striker = non_striker, striker
+            if out is not None :
+                fallen += 1
+                if fallen >= wickets :
+                    break
+                if out == striker :
+                    striker = batters[next_in]
+                else :
+                    non_striker = batters[next_in]
+                next_in += 1
+            if target is not None and runs >= target :
+                break
+        over_list.append({"over": over, "deliveries": deliveries})
+        if fallen >= wickets or (target is not None and runs >= target) :
+            break
+        striker, non_striker = non_striker, striker
+    return {"team": team, "overs": over_list}, runs, fallen
+
+if __name__ == "__main__" :
+    generate(sys.argv[1], int(sys.argv[2]), seed=int(sys.argv[3]) if len(sys.argv) > 3 else 0)
@@ -0,0 +1,68 @@
+import os
+import shutil
+import sys
+import types
+import pandas as pd
+import pytest
+
+# The repository is the CricBase package itself (there's no __init__.py), so it's registered
+# under that name whatever the checkout is called
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+package = types.ModuleType("CricBase")
+package.__path__ = [ROOT]
+sys.modules["CricBase"] = package
+
+from CricBase import database
+from CricBase import synthetic
+
+@pytest.fixture(scope="session")
+def archive(tmp_path_factory) :
+    """A directory of 50 synthetic scorecards over three seasons, shared by every test that only reads it."""
+    path = tmp_path_factory.mktemp("archive")
+    synthetic.generate(str(path), 50, seed=1, matches_per_season=20)
+    return str(path)
+
+@pytest.fixture
+def archive_copy(archive, tmp_path) :
+    """A copy of the synthetic archive that a test may change."""
+    path = os.path.join(tmp_path, "archive")
+    shutil.copytree(archive, path)
+    return path
+
+def table_rows(connection, table: str) :
+    """
+    Reads a table with match, team and player ids swapped for the keys they stand for, sorted,
+    so that databases loaded in different orders can be compared.
+
+    Arguments:
+        connection: a connection to the database
+        table: the table to read
+    Returns:
+        a DataFrame of the table's rows, as strings
+    """
+    frame = pd.read_sql(f"SELECT * FROM {table}", connection)
+    teams = dict(connection.execute("SELECT team_id, name FROM team").fetchall())
+    # player_ids depend on the order players were first seen in, so they're compared by identifier
+    players = dict(connection.execute("SELECT player_id, identifier FROM player").fetchall())
+    player_columns = {"player_season": ["player_id"], "player_team": ["player_id"], "player_career": ["player_id"],
+                      "head_to_head": ["batter", "bowler"], "player": ["player_id"]}
+    player_columns.update(database.PLAYER_COLUMNS)
+    for column in player_columns.get(table, []) :
+        frame[column] = frame[column].map(players)
+    matches = pd.read_sql("SELECT match_id, season, match_number FROM match", connection)
+    if table == "manifest" :
+        frame = frame.merge(matches, on="match_id").drop(columns=["match_id", "mtime"])
+    elif table in database.MATCH_TABLES :
+        for column in database.TEAM_COLUMNS[table] :
+            frame[column] = frame[column].map(teams)
+        if table != "match" :
+            frame = frame.merge(matches, on="match_id")
+        frame = frame.drop(columns=["match_id"])
+    elif table == "player_team" :
+        frame["team"] = frame["team"].map(teams)
+    frame = frame.round(9).astype(str)
+    return frame.sort_values(list(frame.columns)).reset_index(drop=True)
+
+@pytest.fixture
+def rows_of() :
+    return table_rows
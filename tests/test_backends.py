@@ -0,0 +1,35 @@
+import glob
+import json
+import os
+import pandas as pd
+import pytest
+from CricBase import data_read
+
+TABLES = ["match", "player", "player_match", "delivery", "wickets", "extras", "fielder_wickets"]
+
+def installed(backend) :
+    try :
+        data_read.json_decoder(backend)
+    except ImportError :
+        return pytest.param(backend, marks=pytest.mark.skip(reason=f"{backend} isn't installed"))
+    return backend
+
+BACKENDS = [installed(backend) for backend in data_read.JSON_BACKENDS]
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_backend_matches_json(archive, backend) :
+    expected = data_read.DataRead(archive, json_backend="json")
+    tables = data_read.DataRead(archive, json_backend=backend)
+    for table in TABLES :
+        pd.testing.assert_frame_equal(getattr(tables, table), getattr(expected, table), obj=table)
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_backend_rejects_missing_innings(archive_copy, backend) :
+    filename = sorted(glob.glob(os.path.join(archive_copy, '*.json')))[0]
+    with open(filename) as f :
+        scorecard = json.load(f)
+    del scorecard["innings"]
+    with open(filename, 'w') as f :
+        json.dump(scorecard, f)
+    with pytest.raises(KeyError) :
+        data_read.parse_rows([filename], backend)
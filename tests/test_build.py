@@ -0,0 +1,53 @@
+import os
+import shutil
+import pandas as pd
+from CricBase import database
+
+def test_batches_match_single_build(archive, tmp_path, rows_of) :
+    single = database.CricDB(os.path.join(tmp_path, "single.db"))
+    single.create_db(archive)
+    batched = database.CricDB(os.path.join(tmp_path, "batched.db"))
+    batched.create_db(archive, batch_size=7)
+    for table in database.MATCH_TABLES + ["player", "manifest"] + list(database.SUMMARIES) :
+        pd.testing.assert_frame_equal(rows_of(batched.connection, table), rows_of(single.connection, table), obj=table)
+    single.close()
+    batched.close()
+
+def test_players_load_without_scorecards(archive, tmp_path) :
+    people = pd.read_csv(os.path.join(archive, "people.csv"))
+    empty = os.path.join(tmp_path, "empty")
+    os.makedirs(empty)
+    shutil.copy(os.path.join(archive, "people.csv"), empty)
+    db = database.CricDB(os.path.join(tmp_path, "empty.db"))
+    db.create_db(empty)
+    assert db.connection.execute("SELECT COUNT(*) FROM player").fetchone()[0] == len(people)
+    assert db.connection.execute("SELECT COUNT(*) FROM match").fetchone()[0] == 0
+    # Filters that match nothing load the players all the same
+    db.create_db(archive, match_types=["Test"])
+    assert db.connection.execute("SELECT COUNT(*) FROM player").fetchone()[0] == len(people)
+    db.close()
+
+def test_players_stored_by_integer_id(archive_copy, tmp_path) :
+    # A player missing from people.csv still gets a player_id, with just their identifier
+    people_file = os.path.join(archive_copy, "people.csv")
+    people = pd.read_csv(people_file)
+    missing = people["identifier"].iloc[0]
+    people.iloc[1:].to_csv(people_file, index=False)
+    db = database.CricDB(os.path.join(tmp_path, "ids.db"))
+    db.create_db(archive_copy)
+    cursor = db.connection.cursor()
+    for table, columns in database.PLAYER_COLUMNS.items() :
+        for column in columns :
+            assert cursor.execute(f"SELECT COUNT(*) FROM {table} WHERE typeof({column}) != 'integer'").fetchone()[0] == 0
+            assert cursor.execute(f"""SELECT COUNT(*) FROM {table} t LEFT JOIN player p ON p.player_id = t.{column}
+                WHERE p.player_id IS NULL""").fetchone()[0] == 0
+    assert cursor.execute("SELECT name FROM player WHERE identifier = ?", (missing,)).fetchone() == (None,)
+    ids = dict(cursor.execute("SELECT identifier, player_id FROM player"))
+
+    # Once people.csv lists them again, every player keeps their id
+    people.iloc[::-1].to_csv(people_file, index=False)
+    db.update_db(archive_copy)
+    assert dict(cursor.execute("SELECT identifier, player_id FROM player")) == ids
+    assert cursor.execute("SELECT name FROM player WHERE identifier = ?", (missing,)).fetchone()[0] == people["name"].iloc[0]
+    cursor.close()
+    db.close()
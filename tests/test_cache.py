@@ -0,0 +1,49 @@
+import os
+import pandas as pd
+import pytest
+from CricBase import cache
+from CricBase import data_read
+
+TABLES = ["match", "player_match", "delivery", "wickets", "extras", "fielder_wickets"]
+
+def blobs(directory) :
+    return [entry for entry in os.scandir(directory) if entry.name.endswith(".pkl")]
+
+def assert_same_tables(db, expected) :
+    for table in TABLES :
+        pd.testing.assert_frame_equal(getattr(db, table), getattr(expected, table), obj=table)
+
+def test_cached_builds_match_uncached(archive, tmp_path, monkeypatch) :
+    expected = data_read.DataRead(archive)
+    cache_dir = os.path.join(tmp_path, "cache")
+    assert_same_tables(data_read.DataRead(archive, cache_dir=cache_dir), expected)
+    assert len(blobs(cache_dir)) == len(expected.match)
+    # A warm build reads every scorecard from the cache
+    monkeypatch.setattr(data_read, "parse_files", lambda *args : pytest.fail("parsed a cached scorecard"))
+    assert_same_tables(data_read.DataRead(archive, cache_dir=cache_dir), expected)
+
+def test_corrupt_blobs_are_parsed_again(archive, tmp_path) :
+    expected = data_read.DataRead(archive)
+    cache_dir = os.path.join(tmp_path, "cache")
+    data_read.DataRead(archive, cache_dir=cache_dir)
+    damaged = blobs(cache_dir)[:2]
+    with open(damaged[0].path, 'wb') as f :
+        f.write(b"not a pickle")
+    with open(damaged[1].path, 'r+b') as f :
+        f.truncate(10) # as if the writer had crashed part way
+    assert_same_tables(data_read.DataRead(archive, cache_dir=cache_dir), expected)
+    assert len(blobs(cache_dir)) == len(expected.match)
+
+def test_eviction_keeps_cache_under_cap(archive, tmp_path) :
+    cache_dir = os.path.join(tmp_path, "cache")
+    data_read.DataRead(archive, cache_dir=cache_dir)
+    blob_size = max(entry.stat().st_size for entry in blobs(cache_dir))
+    cap = blob_size * 10
+    small_dir = os.path.join(tmp_path, "small")
+    expected = data_read.DataRead(archive)
+    assert_same_tables(data_read.DataRead(archive, cache_dir=small_dir, cache_size=cap), expected)
+    kept = blobs(small_dir)
+    assert 0 < len(kept) < len(expected.match)
+    assert sum(entry.stat().st_size for entry in kept) <= cap
+    # The cache's own count of its size matches what's on disk when it's reopened
+    assert cache.ScorecardCache(small_dir, cap).size == sum(entry.stat().st_size for entry in kept)
@@ -0,0 +1,54 @@
+import glob
+import json
+import os
+import shutil
+import numpy as np
+import pandas as pd
+from CricBase import data_read
+
+def reference_state(path) :
+    """Works out the state of each innings after every delivery by walking the JSON in order."""
+    rows = []
+    for filename in sorted(glob.glob(os.path.join(path, '*.json'))) :
+        with open(filename) as f :
+            innings = json.load(f)["innings"]
+        target = innings[1]["target"] if len(innings) > 1 else None
+        for count, innings_data in enumerate(innings[:2]) :
+            runs = wickets = legal_balls = 0
+            for over_data in innings_data["overs"] :
+                for delivery_data in over_data["deliveries"] :
+                    runs += delivery_data["runs"]["total"]
+                    wickets += len(delivery_data.get("wickets", []))
+                    extras = delivery_data.get("extras", {})
+                    if not extras.get("wides") and not extras.get("noballs") :
+                        legal_balls += 1
+                    balls_remaining = required_rate = np.nan
+                    if count == 1 :
+                        overs = target["overs"]
+                        balls_remaining = int(overs) * 6 + round((overs - int(overs)) * 10) - legal_balls
+                        if balls_remaining > 0 :
+                            required_rate = (target["runs"] - runs) * 6 / balls_remaining
+                    rows.append((runs, wickets, legal_balls, balls_remaining, required_rate))
+    return pd.DataFrame(rows, columns=data_read.DELIVERY_STATE)
+
+def test_delivery_state_matches_reference(archive) :
+    db = data_read.DataRead(archive)
+    state = db.delivery[data_read.DELIVERY_STATE].reset_index(drop=True)
+    pd.testing.assert_frame_equal(state, reference_state(archive), check_dtype=False)
+
+def test_grouped_cumsum() :
+    values = np.array([1, 2, 3, 4, 5])
+    groups = np.array([1, 0, 1, 0, 1])
+    assert data_read.grouped_cumsum(values, groups, np.arange(5)).tolist() == [1, 2, 4, 6, 9]
+    assert data_read.grouped_cumsum(values, groups, np.arange(5)[::-1]).tolist() == [9, 6, 8, 4, 5]
+    assert len(data_read.grouped_cumsum(np.array([], dtype=np.int64), np.array([], dtype=np.int64),
+                                        np.array([], dtype=np.int64))) == 0
+
+def test_no_deliveries(archive, tmp_path) :
+    # An archive with no scorecards (or none that pass the filters) gives empty tables
+    shutil.copy(os.path.join(archive, "people.csv"), tmp_path)
+    db = data_read.DataRead(str(tmp_path))
+    assert len(db.delivery) == 0
+    assert set(data_read.DELIVERY_STATE) <= set(db.delivery.columns)
+    assert len(db.player_match) == 0
+    assert len(data_read.DataRead(archive, match_types=["Test"]).delivery) == 0
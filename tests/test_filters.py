@@ -0,0 +1,76 @@
+import glob
+import json
+import os
+import pandas as pd
+import pytest
+from CricBase import data_read
+from CricBase import database
+
+def scorecard_files(path) :
+    return sorted(glob.glob(os.path.join(path, '*.json')))
+
+def test_scan_info_skips_innings_victories(archive_copy, monkeypatch) :
+    # An innings victory's margin has an "innings" key of its own, inside the info block
+    filename = scorecard_files(archive_copy)[0]
+    with open(filename) as f :
+        scorecard = json.load(f)
+    scorecard["info"]["match_type"] = "Test"
+    scorecard["info"]["outcome"] = {"winner": scorecard["info"]["teams"][0], "by": {"innings": 1, "runs": 5}}
+    with open(filename, 'w') as f :
+        json.dump(scorecard, f)
+    for module, name in ((json, "loads"), (data_read, "read_scorecard")) :
+        monkeypatch.setattr(module, name, lambda *args, **kwargs : pytest.fail("decoded the whole scorecard"))
+    assert data_read.scan_info(filename) == scorecard["info"]
+
+def test_scan_info_fallback_keeps_every_field(archive_copy, monkeypatch) :
+    # A key called info ahead of the real one throws the quick scan off, so the file is decoded in full
+    filename = scorecard_files(archive_copy)[0]
+    with open(filename) as f :
+        scorecard = json.load(f)
+    scorecard["meta"]["info"] = 1
+    with open(filename, 'w') as f :
+        json.dump(scorecard, f)
+    # The lazy simdjson decoder only keeps SCORECARD_INFO, which has no teams or match_type
+    monkeypatch.setattr(data_read, "json_backend_name", lambda name = None : "simdjson")
+    assert data_read.scan_info(filename) == scorecard["info"]
+
+def test_filters_match_full_build(archive_copy) :
+    full = data_read.DataRead(archive_copy)
+    season = str(full.match["season"].iloc[0])
+    team = full.match["batting_first"].iloc[0]
+    dates = sorted(full.match["start_date"])
+    cases = [({"seasons": [season]}, full.match["season"].astype(str) == season),
+             ({"teams": [team]}, (full.match["batting_first"] == team) | (full.match["chasing"] == team)),
+             ({"start_date": dates[10], "end_date": dates[20]},
+              (full.match["start_date"] >= dates[10]) & (full.match["start_date"] <= dates[20])),
+             ({"match_types": ["T20"]}, pd.Series(True, index=full.match.index)),
+             ({"match_types": ["Test"]}, pd.Series(False, index=full.match.index))]
+    for filters, expected in cases :
+        db = data_read.DataRead(archive_copy, **filters)
+        assert sorted(db.match["start_date"]) == sorted(full.match["start_date"][expected.to_numpy()]), filters
+    assert os.path.exists(os.path.join(archive_copy, data_read.INDEX_FILE))
+
+def test_index_is_reused(archive_copy, monkeypatch) :
+    files = scorecard_files(archive_copy)
+    index = data_read.scan_index(archive_copy, files)
+    scanned = []
+    real_scan = data_read.scan_info
+    monkeypatch.setattr(data_read, "scan_info", lambda filename : scanned.append(filename) or real_scan(filename))
+    pd.testing.assert_frame_equal(data_read.scan_index(archive_copy, files), index)
+    assert scanned == []
+    os.utime(files[3], ns=(0, 0))
+    data_read.scan_index(archive_copy, files)
+    assert scanned == [files[3]]
+
+def test_filtered_update_matches_rebuild(archive, tmp_path, rows_of) :
+    seasons = data_read.DataRead(archive).match["season"].astype(str).unique()
+    db = database.CricDB(os.path.join(tmp_path, "update.db"))
+    db.create_db(archive, seasons=seasons[:2])
+    # Narrowing the filters deletes the matches that no longer pass
+    db.update_db(archive, seasons=seasons[1:2])
+    full = database.CricDB(os.path.join(tmp_path, "full.db"))
+    full.create_db(archive, seasons=seasons[1:2])
+    for table in database.MATCH_TABLES + ["manifest"] + list(database.SUMMARIES) :
+        pd.testing.assert_frame_equal(rows_of(db.connection, table), rows_of(full.connection, table), obj=table)
+    db.close()
+    full.close()
@@ -0,0 +1,49 @@
+import glob
+import json
+import os
+import pandas as pd
+import pytest
+from CricBase import data_read
+
+pytest.importorskip("pyarrow")
+
+def comparable(table) :
+    """Drops the dtypes that a Parquet round trip doesn't keep: categories, and seasons that were numbers."""
+    table = table.copy()
+    for column in table.columns :
+        if isinstance(table[column].dtype, pd.CategoricalDtype) :
+            table[column] = table[column].astype(object)
+    if "season" in table.columns :
+        table["season"] = table["season"].astype(str)
+    return table
+
+def assert_round_trip(db, path) :
+    db.to_parquet(path)
+    loaded = data_read.DataRead.from_parquet(path)
+    for name, table in db.tables().items() :
+        if name == "player_match" :
+            table = table.astype(data_read.PLAYER_MATCH_DTYPES)
+        pd.testing.assert_frame_equal(comparable(getattr(loaded, name)), comparable(table), check_dtype=False, obj=name)
+    return loaded
+
+def test_parquet_round_trip(archive_copy, tmp_path) :
+    # Move the first match into the last season, so its rows are read back last and have to be
+    # put back in match order
+    files = sorted(glob.glob(os.path.join(archive_copy, '*.json')))
+    with open(files[-1]) as f :
+        last_season = json.load(f)["info"]["season"]
+    with open(files[0]) as f :
+        scorecard = json.load(f)
+    scorecard["info"]["season"] = last_season
+    with open(files[0], 'w') as f :
+        json.dump(scorecard, f)
+    db = data_read.DataRead(archive_copy)
+    loaded = assert_round_trip(db, os.path.join(tmp_path, "parquet"))
+    assert loaded.delivery["match_id"].is_monotonic_increasing
+    # Exporting again replaces the earlier export rather than adding to it
+    assert_round_trip(db, os.path.join(tmp_path, "parquet"))
+
+def test_parquet_round_trip_empty(archive, tmp_path) :
+    db = data_read.DataRead(archive, match_types=["Test"])
+    assert len(db.delivery) == 0
+    assert_round_trip(db, os.path.join(tmp_path, "parquet"))
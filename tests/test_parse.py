@@ -0,0 +1,43 @@
+import glob
+import os
+import numpy as np
+import pandas as pd
+import pytest
+from CricBase import data_read
+
+TABLES = ["match", "player", "player_match", "delivery", "wickets", "extras", "fielder_wickets"]
+
+def test_pool_matches_in_process(archive) :
+    single = data_read.DataRead(archive)
+    pooled = data_read.DataRead(archive, workers=2)
+    for table in TABLES :
+        pd.testing.assert_frame_equal(getattr(pooled, table), getattr(single, table), obj=table)
+
+def test_merged_chunks_match_rows(archive) :
+    files = sorted(glob.glob(os.path.join(archive, '*.json')))
+    rows = data_read.parse_rows(files)
+    # Uneven chunks, including one with a single file
+    tables = data_read.merge_chunks([data_read.parse_files(files[:7]), data_read.parse_files(files[7:8]),
+                                     data_read.parse_files(files[8:])])
+    for table, columns in data_read.SCORECARD_TABLES.items() :
+        pd.testing.assert_frame_equal(tables[table], pd.DataFrame(rows[table], columns=columns), obj=table)
+
+@pytest.mark.parametrize("parts", [
+    [[2008, 2009], ["2009/10", "2010/11"]], # seasons written as numbers in some files and text in others
+    [[None, None], ["Eliminator", None]],
+    [[None, None], [18.4, 20]],
+    [[1, 2], [2.5, None]],
+    [[1, 2], [True, False]],
+    [[], ["a"], []],
+    [[], []],
+])
+def test_unpacked_columns_keep_their_types(parts) :
+    column = pd.DataFrame({"column": data_read.unpack_columns([data_read.pack_column(part) for part in parts])})
+    expected = pd.DataFrame([[value] for part in parts for value in part], columns=["column"])
+    pd.testing.assert_frame_equal(column, expected)
+
+def test_packed_columns_are_compact() :
+    packed = data_read.pack_column(list(range(100)))
+    assert packed.dtype == np.int8
+    codes, uniques = data_read.pack_column(["a", "b", "a", None] * 100)
+    assert codes.dtype == np.int8 and list(uniques) == ["a", "b"]
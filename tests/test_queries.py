@@ -0,0 +1,152 @@
+import os
+import sqlite3
+import threading
+import pandas as pd
+import pytest
+from CricBase import cache
+from CricBase import database
+
+@pytest.fixture
+def cricdb(archive, tmp_path) :
+    db = database.CricDB(os.path.join(tmp_path, "query.db"))
+    db.create_db(archive)
+    yield db
+    db.close()
+
+def busiest_player(db) :
+    return db.connection.execute("""SELECT p.identifier FROM player_career c JOIN player p ON p.player_id = c.player_id
+        ORDER BY c.matches DESC LIMIT 1""").fetchone()[0]
+
+def test_first_query_from_another_thread(cricdb) :
+    player = busiest_player(cricdb)
+    expected = pd.read_sql(database.QUERIES["player_scorecard"], cricdb.connection, params=(player,))
+    start = threading.Barrier(4)
+    results, errors = [], []
+
+    def worker() :
+        start.wait()
+        try :
+            results.append(cricdb.player_scorecard(player))
+        except Exception as error :
+            errors.append(error)
+
+    threads = [threading.Thread(target=worker) for _ in range(4)]
+    for thread in threads :
+        thread.start()
+    for thread in threads :
+        thread.join()
+    assert errors == []
+    assert len(expected) > 0
+    for result in results :
+        pd.testing.assert_frame_equal(result, expected)
+    with sqlite3.connect(cricdb.dbpath) as other :
+        assert other.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+
+def test_rebuild_keeps_wal(cricdb, archive) :
+    player = busiest_player(cricdb)
+    before = cricdb.player_scorecard(player)
+    cricdb.create_db(archive)
+    cricdb.update_db(archive)
+    with sqlite3.connect(cricdb.dbpath) as other :
+        assert other.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    pd.testing.assert_frame_equal(cricdb.player_scorecard(player), before)
+
+def test_results_follow_other_connections(cricdb) :
+    player = busiest_player(cricdb)
+    runs = cricdb.season_leaders(cricdb.connection.execute("SELECT MIN(season) FROM match").fetchone()[0])
+    assert len(runs) > 0
+    before = cricdb.player_scorecard(player)
+    # A change committed by another connection (as another process would) isn't served from the cache
+    with sqlite3.connect(cricdb.dbpath) as other :
+        other.execute(f"UPDATE player_match SET runs_scored = runs_scored + 1 WHERE player_id = {database.PLAYER_ID}", (player,))
+    after = cricdb.player_scorecard(player)
+    assert (after["runs_scored"] == before["runs_scored"] + 1).all()
+    assert cricdb.player_scorecard(player).equals(after)
+
+def test_stale_results_are_not_cached() :
+    results = cache.ResultCache(4)
+    generation = results.generation
+    results.clear() # the database changed while the result was being worked out
+    results.put("key", "stale", generation)
+    assert results.get("key") is None
+    results.put("key", "fresh", results.generation)
+    assert results.get("key") == "fresh"
+
+def test_queries_take_and_give_identifiers(cricdb, archive) :
+    from CricBase import data_read
+    db = data_read.DataRead(archive)
+    player = busiest_player(cricdb)
+    scorecard = cricdb.player_scorecard(player)
+    assert len(scorecard) == (db.player_match["player_id"] == player).sum()
+    assert scorecard["runs_scored"].sum() == db.player_match.loc[db.player_match["player_id"] == player, "runs_scored"].sum()
+    deliveries = cricdb.match_deliveries(0)
+    first = db.delivery[db.delivery["match_id"] == 0]
+    assert deliveries["batter"].tolist() == first["batter"].astype(str).tolist()
+    assert deliveries["non_striker"].tolist() == first["non_striker"].astype(str).tolist()
+    batting = cricdb.head_to_head(batter=player)
+    assert set(batting["batter"]) == {player}
+    assert batting["balls"].sum() == db.player_match.loc[db.player_match["player_id"] == player, "balls_faced"].sum()
+    pair = cricdb.head_to_head(batter=player, bowler=batting["bowler"].iloc[0])
+    pd.testing.assert_frame_equal(pair, batting.iloc[[0]].reset_index(drop=True))
+    leaders = cricdb.season_leaders(db.match["season"].iloc[0])
+    assert leaders["player_id"].isin(db.player_match["player_id"].astype(str)).all()
+
+def call_with_timeout(function, seconds = 10) :
+    """Calls a function on another thread, returning what it raised, or failing if it doesn't finish in time."""
+    outcome = []
+
+    def run() :
+        try :
+            function()
+            outcome.append(None)
+        except Exception as error :
+            outcome.append(error)
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    thread.join(seconds)
+    assert not thread.is_alive(), "hung waiting for a connection"
+    return outcome[0]
+
+def test_failed_opens_give_their_slot_back(tmp_path) :
+    pool = database.ReadPool(os.path.join(tmp_path, "missing", "x.db"), 1)
+
+    def borrow() :
+        with pool.connection() :
+            pass
+
+    for _ in range(3) :
+        assert isinstance(call_with_timeout(borrow), sqlite3.OperationalError)
+    assert pool.opened == 0
+
+def test_failed_open_wakes_waiting_thread(cricdb, monkeypatch) :
+    pool = database.ReadPool(cricdb.dbpath, 1)
+    opening, fail = threading.Event(), threading.Event()
+    real_open = pool.open
+    attempts = []
+
+    def open_once_failing() :
+        attempts.append(threading.current_thread().name)
+        if len(attempts) == 1 :
+            opening.set()
+            fail.wait()
+            raise sqlite3.OperationalError("unable to open database file")
+        return real_open()
+
+    monkeypatch.setattr(pool, "open", open_once_failing)
+
+    def borrow() :
+        with pool.connection() as connection :
+            connection.execute("SELECT COUNT(*) FROM match").fetchone()
+
+    first = threading.Thread(target=lambda : call_with_timeout(borrow))
+    first.start()
+    opening.wait()
+    # The pool's only slot is taken by the open that's about to fail, so this waits for it
+    waiting = threading.Thread(target=lambda : attempts.append(call_with_timeout(borrow)))
+    waiting.start()
+    fail.set()
+    first.join()
+    waiting.join()
+    assert attempts[-1] is None
+    pool.close()
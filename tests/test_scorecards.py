@@ -0,0 +1,27 @@
+import pandas as pd
+from CricBase import benchmark
+from CricBase import data_read
+
+def unscored_reader(path) :
+    """Reads the JSON tables of an archive without computing any player_match figures."""
+    db = benchmark.bare_reader(path)
+    db.match, db.player, db.player_match, db.delivery, db.wickets, db.extras, db.fielder_wickets = db.scorecard_data()
+    db.encode_keys()
+    return db
+
+def test_player_scorecards_match_merges(archive) :
+    single = unscored_reader(archive)
+    single.player_scorecards()
+    merged = unscored_reader(archive)
+    merged.merge_scorecards()
+    assert list(single.player_match.columns) == data_read.PLAYER_MATCH_ATTRS + data_read.SCORECARD_STATS
+    pd.testing.assert_frame_equal(merged.player_match, single.player_match)
+
+def test_scorecards_add_up(archive) :
+    db = data_read.DataRead(archive)
+    # Every delivery's runs off the bat are credited to its batter, and every delivery but a
+    # wide or a noball counts as a ball faced
+    assert db.player_match["runs_scored"].sum() == db.delivery["runs"].sum()
+    innings = db.delivery.groupby(["match_id", "team_batting"], observed=True)
+    assert db.player_match["balls_faced"].sum() == innings["legal_balls"].max().sum()
+    assert db.player_match["wickets"].sum() <= len(db.wickets)
@@ -0,0 +1,42 @@
+import os
+import shutil
+import pandas as pd
+from CricBase import database
+
+def test_summaries_add_up(archive, tmp_path) :
+    db = database.CricDB(os.path.join(tmp_path, "summaries.db"))
+    db.create_db(archive)
+    player_match = pd.read_sql("SELECT * FROM player_match", db.connection).groupby("player_id")
+    career = pd.read_sql("SELECT * FROM player_career", db.connection).set_index("player_id")
+    for column in ["runs_scored", "balls_faced", "wickets", "runs_conceded"] :
+        assert (player_match[column].sum().reindex(career.index) == career[column]).all(), column
+    assert (player_match.size().reindex(career.index) == career["matches"]).all()
+    seasons = pd.read_sql("SELECT player_id, SUM(runs_scored) AS runs FROM player_season GROUP BY player_id",
+                          db.connection).set_index("player_id")["runs"]
+    assert (seasons.reindex(career.index) == career["runs_scored"]).all()
+    # Every ball a batter faced was bowled by someone
+    head_to_head = pd.read_sql("SELECT batter, SUM(balls) AS balls, SUM(runs) AS runs FROM head_to_head GROUP BY batter",
+                               db.connection).set_index("batter")
+    assert (player_match["balls_faced"].sum().reindex(head_to_head.index) == head_to_head["balls"]).all()
+    assert (player_match["runs_scored"].sum().reindex(head_to_head.index) == head_to_head["runs"]).all()
+    db.close()
+
+def test_summaries_update_matches_rebuild(archive_copy, tmp_path, rows_of) :
+    files = sorted(name for name in os.listdir(archive_copy) if name.endswith(".json"))
+    held = os.path.join(tmp_path, "held")
+    os.makedirs(held)
+    for name in files[-5:] :
+        shutil.move(os.path.join(archive_copy, name), held)
+    db = database.CricDB(os.path.join(tmp_path, "update.db"))
+    db.create_db(archive_copy)
+    for name in files[-5:] :
+        shutil.move(os.path.join(held, name), archive_copy)
+    os.remove(os.path.join(archive_copy, files[0]))
+    db.update_db(archive_copy)
+
+    full = database.CricDB(os.path.join(tmp_path, "full.db"))
+    full.create_db(archive_copy)
+    for table in database.SUMMARIES :
+        pd.testing.assert_frame_equal(rows_of(db.connection, table), rows_of(full.connection, table), obj=table)
+    db.close()
+    full.close()
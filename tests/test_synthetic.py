@@ -0,0 +1,38 @@
+import os
+import random
+import pandas as pd
+from CricBase import synthetic
+
+class RepeatingBits(random.Random) :
+    """A generator whose first two identifiers are the same."""
+
+    def __init__ (self) :
+        super().__init__(0)
+        self.draws = [7, 7, 8]
+
+    def getrandbits(self, k) :
+        # Only identifiers take 32 bits; names are picked with smaller draws
+        if k == 32 and len(self.draws) > 0 :
+            return self.draws.pop(0)
+        return super().getrandbits(k)
+
+def test_identifiers_never_repeat() :
+    rng = RepeatingBits()
+    people, identifiers = {}, set()
+    first = synthetic.new_person(rng, people, identifiers)
+    second = synthetic.new_person(rng, people, identifiers)
+    assert people[first] == "00000007"
+    assert people[second] == "00000008"
+    assert identifiers == {"00000007", "00000008"}
+
+def test_generated_people_are_unique(archive) :
+    people = pd.read_csv(os.path.join(archive, "people.csv"), dtype=str)
+    assert people["identifier"].is_unique
+    assert people["name"].is_unique
+
+def test_same_seed_same_files(tmp_path) :
+    for directory in ("a", "b") :
+        synthetic.generate(os.path.join(tmp_path, directory), 3, seed=5)
+    for name in sorted(os.listdir(os.path.join(tmp_path, "a"))) :
+        with open(os.path.join(tmp_path, "a", name)) as a, open(os.path.join(tmp_path, "b", name)) as b :
+            assert a.read() == b.read(), name
@@ -0,0 +1,81 @@
+import json
+import os
+import shutil
+import pandas as pd
+from CricBase import database
+
+def test_update_matches_rebuild(archive_copy, tmp_path, rows_of) :
+    files = sorted(name for name in os.listdir(archive_copy) if name.endswith(".json"))
+    held = os.path.join(tmp_path, "held")
+    os.makedirs(held)
+    for name in files[-3:] :
+        shutil.move(os.path.join(archive_copy, name), held)
+    db = database.CricDB(os.path.join(tmp_path, "update.db"))
+    db.create_db(archive_copy)
+
+    # Three new files, one edited, one removed and one only touched
+    for name in files[-3:] :
+        shutil.move(os.path.join(held, name), archive_copy)
+    edited = os.path.join(archive_copy, files[0])
+    with open(edited) as f :
+        scorecard = json.load(f)
+    scorecard["info"]["city"] = "Changed"
+    with open(edited, 'w') as f :
+        json.dump(scorecard, f)
+    os.remove(os.path.join(archive_copy, files[1]))
+    os.utime(os.path.join(archive_copy, files[2]))
+
+    changed = db.update_db(archive_copy)
+    assert sorted(os.path.basename(filename) for filename in changed) == sorted([files[0]] + files[-3:])
+    assert db.update_db(archive_copy) == []
+
+    full = database.CricDB(os.path.join(tmp_path, "full.db"))
+    full.create_db(archive_copy)
+    for table in database.MATCH_TABLES + ["player", "manifest"] :
+        pd.testing.assert_frame_equal(rows_of(db.connection, table), rows_of(full.connection, table), obj=table)
+    db.close()
+    full.close()
+
+def test_update_without_manifest_creates(archive, tmp_path) :
+    db = database.CricDB(os.path.join(tmp_path, "new.db"))
+    changed = db.update_db(archive)
+    assert len(changed) == 50
+    assert db.connection.execute("SELECT COUNT(*) FROM match").fetchone()[0] == 50
+    db.close()
+
+def test_update_keeps_journal_on_disk(archive, tmp_path) :
+    db = database.CricDB(os.path.join(tmp_path, "journal.db"))
+    db.create_db(archive)
+    statements = []
+    db.connection.set_trace_callback(statements.append)
+    db.update_db(archive)
+    pragmas = [statement for statement in statements if statement.startswith("PRAGMA") and "=" in statement]
+    assert "PRAGMA synchronous = NORMAL" in pragmas
+    assert not any("journal_mode" in statement or "synchronous = OFF" in statement for statement in pragmas)
+    db.close()
+
+def test_update_reloads_changed_people(archive_copy, tmp_path, rows_of) :
+    db = database.CricDB(os.path.join(tmp_path, "people.db"))
+    db.create_db(archive_copy)
+    people_file = os.path.join(archive_copy, "people.csv")
+    # Only touched, so the players aren't reloaded
+    os.utime(people_file)
+    statements = []
+    db.connection.set_trace_callback(statements.append)
+    assert db.update_db(archive_copy) == []
+    assert "DROP TABLE IF EXISTS player" not in statements
+    db.connection.set_trace_callback(None)
+
+    # A registry update on its own, with no scorecards changed
+    people = pd.read_csv(people_file)
+    people.loc[0, "name"] = "Renamed"
+    people = pd.concat([people, people.iloc[[1]].assign(identifier="newperson", name="New Person")])
+    people.to_csv(people_file, index=False)
+    assert db.update_db(archive_copy) == []
+    full = database.CricDB(os.path.join(tmp_path, "full.db"))
+    full.create_db(archive_copy)
+    for table in ["player", "manifest"] :
+        pd.testing.assert_frame_equal(rows_of(db.connection, table), rows_of(full.connection, table), obj=table)
+    assert db.connection.execute("SELECT name FROM player WHERE identifier = 'newperson'").fetchone() == ("New Person",)
+    db.close()
+    full.close()